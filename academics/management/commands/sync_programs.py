@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from academics import programs
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh each Student's program from Dynamics "
+        "mshied_academicperioddetails, incrementally on modifiedon unless "
+        "a full pass is due or forced."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Re-pull every period and reset students with none",
+        )
+
+    def handle(self, *args, **opts):
+        if not getattr(settings, "DYNAMICS_ORG_URL", ""):
+            self.stderr.write("DYNAMICS_ORG_URL is not configured.")
+            return
+        pstats = programs.sync(full=opts.get("full", False))
+        line = (
+            f"{'Full' if pstats['full'] else 'Incremental'} program sync: "
+            f"fetched={pstats['fetched']} changed={pstats['changed']}."
+        )
+        if pstats["error"]:
+            self.stdout.write(self.style.ERROR(
+                f"{line} Error: {pstats['error']}; watermark not advanced."
+            ))
+        elif pstats["reset_skipped"]:
+            self.stdout.write(self.style.WARNING(
+                f"{line} Kept {pstats['reset_skipped']} programs missing from the read "
+                "(exceeds TRANSCRIPT_STORE_MAX_DELETE_FRACTION); full pass will be retried."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(line))
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from academics import programs, transcript_store
+from students.models import Student
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the local transcript store (CourseHistoryRow) from Dynamics "
+        "mshied_coursehistory, incrementally on modifiedon unless a full pass "
+        "is due or forced. Programs are synced by sync_programs; --student "
+        "refreshes both for one student."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Re-pull every row and delete rows missing in Dynamics",
+        )
+        parser.add_argument(
+            "--student",
+            help="Only re-pull this student's rows (Dynamics contact id)",
+        )
+
+    def handle(self, *args, **opts):
+        if not getattr(settings, "DYNAMICS_ORG_URL", ""):
+            self.stderr.write("DYNAMICS_ORG_URL is not configured.")
+            return
+        if opts.get("student"):
+            ok = transcript_store.refresh_student(opts["student"])
+            student = Student.objects.filter(external_student_id=opts["student"]).first()
+            if student:
+                ok = not programs.refresh_student(student)[2] and ok
+            if ok:
+                self.stdout.write(self.style.SUCCESS("Student transcript refreshed."))
+            else:
+                self.stdout.write(self.style.ERROR("Dynamics unavailable; nothing changed."))
+            return
+        stats = transcript_store.refresh(full=opts.get("full", False))
+        line = (
+            f"{'Full' if stats['full'] else 'Incremental'} transcript sync: "
+            f"fetched={stats['fetched']} upserted={stats['upserted']} "
+            f"deleted={stats['deleted']} students={len(stats['students'])}."
+        )
+        if stats["error"]:
+            self.stdout.write(self.style.ERROR(
+                f"{line} Error: {stats['error']}; watermark not advanced."
+            ))
+        elif stats["delete_skipped"]:
+            self.stdout.write(self.style.WARNING(
+                f"{line} Skipped deleting {stats['delete_skipped']} rows "
+                "(exceeds TRANSCRIPT_STORE_MAX_DELETE_FRACTION); full pass will be retried."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(line))
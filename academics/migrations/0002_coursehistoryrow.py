@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("academics", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CourseHistoryRow",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("coursehistory_id", models.CharField(max_length=64, unique=True)),
+                ("student_external_id", models.CharField(max_length=64)),
+                ("program_id", models.CharField(blank=True, max_length=64)),
+                (
+                    "category",
+                    models.CharField(
+                        choices=[
+                            ("NP", "Not published"),
+                            ("FB", "Published, financially blocked"),
+                            ("P", "Published"),
+                        ],
+                        max_length=2,
+                    ),
+                ),
+                ("academic_year", models.CharField(blank=True, max_length=32)),
+                ("source_createdon", models.DateTimeField(blank=True, null=True)),
+                ("source_modifiedon", models.DateTimeField(blank=True, null=True)),
+                ("data", models.JSONField(default=dict)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["student_external_id", "category", "program_id"],
+                        name="academics_ch_student_idx",
+                    )
+                ],
+            },
+        ),
+    ]
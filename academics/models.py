@@ -39,3 +39,36 @@ class ExamSlot(models.Model):
     ends_at = models.DateTimeField()
     venue = models.CharField(max_length=128, blank=True)
     seat = models.CharField(max_length=32, blank=True)
+
+
+class CourseHistoryRow(models.Model):
+    """Local copy of a Dynamics mshied_coursehistory row for the transcript.
+
+    Maintained by academics.transcript_store (sync_transcripts job); ``data``
+    holds the row normalized exactly as the transcript template expects.
+    """
+    NOT_PUBLISHED = "NP"
+    FINANCIAL_BLOCK = "FB"
+    PUBLISHED = "P"
+    CATEGORY_CHOICES = [
+        (NOT_PUBLISHED, "Not published"),
+        (FINANCIAL_BLOCK, "Published, financially blocked"),
+        (PUBLISHED, "Published"),
+    ]
+    coursehistory_id = models.CharField(max_length=64, unique=True)
+    student_external_id = models.CharField(max_length=64)
+    program_id = models.CharField(max_length=64, blank=True)
+    category = models.CharField(max_length=2, choices=CATEGORY_CHOICES)
+    academic_year = models.CharField(max_length=32, blank=True)
+    source_createdon = models.DateTimeField(blank=True, null=True)
+    source_modifiedon = models.DateTimeField(blank=True, null=True)
+    data = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["student_external_id", "category", "program_id"],
+                name="academics_ch_student_idx",
+            ),
+        ]
@@ -0,0 +1,221 @@
+"""Persistent student -> program mapping on ``students.Student``.
+
+The transcript filters course history by the student's program, which used
+to cost a serial academic-period-details FetchXML on every page view.
+``sync()`` (the sync_programs job) keeps ``Student.program_*``
+current from ``mshied_academicperioddetails``, incrementally on
+``modifiedon``; the program of the most recently created period wins.
+``program_for()`` reads the stored value and only falls back to the live
+lookup (persisting its result) for students not resolved yet.
+"""
+import datetime
+import logging
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from crm.models import SyncState
+from crm.service import fetchxml
+from students.models import Student
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "programs:mshied_academicperioddetails"
+PAGE_SIZE = 5000
+
+
+def _period_fetch(since=None, student_ext_id=None, page: int = 1) -> str:
+    conditions = []
+    if since is not None:
+        conditions.append(
+            f"<condition attribute=\"modifiedon\" operator=\"ge\" value=\"{since.isoformat()}\" />"
+        )
+    if student_ext_id:
+        conditions.append(
+            f"<condition attribute=\"mshied_studentid\" operator=\"eq\" value=\"{student_ext_id}\" />"
+        )
+    filter_xml = f"<filter>{''.join(conditions)}</filter>" if conditions else ""
+    return (
+        f"<fetch page=\"{int(page)}\" count=\"{PAGE_SIZE}\">"
+        "  <entity name=\"mshied_academicperioddetails\">"
+        "    <attribute name=\"mshied_academicperioddetailsid\" />"
+        "    <attribute name=\"mshied_studentid\" />"
+        "    <attribute name=\"createdon\" />"
+        "    <attribute name=\"modifiedon\" />"
+        "    <order attribute=\"modifiedon\" />"
+        "    <order attribute=\"mshied_academicperioddetailsid\" />"
+        f"    {filter_xml}"
+        "    <link-entity name=\"mshied_program\" from=\"mshied_programid\" to=\"mshied_programid\" alias=\"prog\">"
+        "      <attribute name=\"mshied_programid\" />"
+        "      <attribute name=\"mshied_name\" />"
+        "    </link-entity>"
+        "  </entity>"
+        "</fetch>"
+    )
+
+
+def _dt(value):
+    return parse_datetime(value) if isinstance(value, str) else None
+
+
+def _latest(rows, into: dict):
+    """Fold rows into ``{ext_id: (createdon, program_id, program_name)}``."""
+    for row in rows:
+        ext = row.get("_mshied_studentid_value")
+        program_id = row.get("prog.mshied_programid")
+        if not ext or not program_id:
+            continue
+        created = _dt(row.get("createdon"))
+        best = into.get(ext)
+        if best is None or (created and (best[0] is None or created >= best[0])):
+            into[ext] = (created, program_id, row.get("prog.mshied_name") or "")
+    return into
+
+
+def _pull(since=None, student_ext_id=None) -> dict:
+    found = {"latest": {}, "fetched": 0, "high_water": None, "error": None}
+    page = 1
+    while True:
+        res = fetchxml(
+            "mshied_academicperioddetails",
+            _period_fetch(since, student_ext_id, page),
+            include_annotations=False,
+        )
+        if res.get("unavailable"):
+            found["error"] = "Dynamics unavailable"
+            break
+        rows = res.get("value") or []
+        found["fetched"] += len(rows)
+        _latest(rows, found["latest"])
+        for row in rows:
+            mod = _dt(row.get("modifiedon"))
+            if mod and (found["high_water"] is None or mod > found["high_water"]):
+                found["high_water"] = mod
+        # morerecords is only annotated when requested; a full page may have more
+        if len(rows) < PAGE_SIZE:
+            break
+        page += 1
+    return found
+
+
+def _store(latest: dict, full: bool) -> int:
+    """Write mappings to existing Students; returns the number changed.
+
+    Incremental passes only replace a mapping with one from an equally new
+    or newer period. A full pass also resets students with no period.
+    """
+    now = timezone.now()
+    changed = []
+    exts = list(latest)
+    if full:
+        students = Student.objects.all().iterator(chunk_size=1000)
+    else:
+        students = (
+            st for i in range(0, len(exts), 500)
+            for st in Student.objects.filter(external_student_id__in=exts[i:i + 500])
+        )
+    for st in students:
+        created, program_id, program_name = latest.get(
+            st.external_student_id, (None, "", "")
+        )
+        if not full and st.program_period_createdon and (
+            created is None or created < st.program_period_createdon
+        ):
+            continue
+        if (st.program_synced_at and st.program_id == program_id
+                and st.program_name == program_name
+                and st.program_period_createdon == created):
+            continue
+        st.program_id = program_id
+        st.program_name = program_name
+        st.program_period_createdon = created
+        st.program_synced_at = now
+        changed.append(st)
+    Student.objects.bulk_update(
+        changed,
+        ["program_id", "program_name", "program_period_createdon", "program_synced_at"],
+        batch_size=500,
+    )
+    return len(changed)
+
+
+def _full_sync_due(state) -> bool:
+    if not state.watermark or not state.last_full_sync_at:
+        return True
+    hours = float(getattr(settings, "TRANSCRIPT_STORE_FULL_SYNC_HOURS", 24))
+    return (timezone.now() - state.last_full_sync_at).total_seconds() >= hours * 3600
+
+
+def sync(full: bool = False) -> dict:
+    """Incremental (or due/forced full) refresh of every Student's program."""
+    state, _ = SyncState.objects.get_or_create(key=STATE_KEY)
+    since = None
+    if not (full or _full_sync_due(state)):
+        try:
+            lookback = int(getattr(settings, "TRANSCRIPT_STORE_LOOKBACK_SECONDS", 300))
+            since = datetime.datetime.fromisoformat(state.watermark) - datetime.timedelta(seconds=lookback)
+        except (TypeError, ValueError):
+            since = None
+    found = _pull(since=since)
+    stats = {
+        "fetched": found["fetched"], "changed": 0,
+        "error": found["error"], "full": since is None, "reset_skipped": 0,
+    }
+    if found["error"] is not None:
+        return stats
+    full_pass = since is None
+    if full_pass:
+        mapped = lost = 0
+        for ext in Student.objects.exclude(program_id="").values_list(
+            "external_student_id", flat=True
+        ).iterator():
+            mapped += 1
+            lost += ext not in found["latest"]
+        max_frac = float(getattr(settings, "TRANSCRIPT_STORE_MAX_DELETE_FRACTION", 0.2))
+        if mapped and lost / mapped > max_frac:
+            # A truncated read must not clear programs; apply it as incremental
+            logger.warning(
+                "Program full sync would clear %d/%d mapped students (over %s); "
+                "skipping resets and retrying the full pass next run",
+                lost, mapped, max_frac,
+            )
+            stats["reset_skipped"] = lost
+            full_pass = False
+    stats["changed"] = _store(found["latest"], full=full_pass)
+    now = timezone.now()
+    fields = ["last_run_at"]
+    state.last_run_at = now
+    if found["high_water"]:
+        state.watermark = found["high_water"].isoformat()
+        fields.append("watermark")
+    if full_pass:
+        state.last_full_sync_at = now
+        fields.append("last_full_sync_at")
+    state.save(update_fields=fields)
+    return stats
+
+
+def refresh_student(student) -> tuple[str, str | None, bool]:
+    """Live lookup for one Student, persisted unless Dynamics was unavailable."""
+    found = _pull(student_ext_id=student.external_student_id)
+    if found["error"] is not None:
+        # Keep serving an earlier mapping; without one the caller can't filter
+        unavailable = student.program_synced_at is None
+        return student.program_id, student.program_name or None, unavailable
+    created, program_id, program_name = found["latest"].get(
+        student.external_student_id, (None, "", "")
+    )
+    student.program_id = program_id
+    student.program_name = program_name
+    student.program_period_createdon = created
+    student.program_synced_at = timezone.now()
+    student.save(update_fields=[
+        "program_id", "program_name", "program_period_createdon", "program_synced_at",
+    ])
+    return program_id, program_name or None, False
+
+
+def program_for(student, refresh: bool = False) -> tuple[str, str | None, bool]:
+    """``(program_id, program_name, unavailable)`` for the transcript."""
+    if student.program_synced_at and not refresh:
+        return student.program_id, student.program_name or None, False
+    return refresh_student(student)
@@ -0,0 +1,72 @@
+"""Shared, bounded cache of Dynamics transcript data per student.
+
+Entries are keyed by the student's external (Dynamics contact) id, so all
+parents of a student share one copy. Payloads are zlib-compressed JSON,
+expire after TRANSCRIPT_CACHE_TTL_SECONDS and are not stored at all when
+larger than TRANSCRIPT_CACHE_MAX_BYTES compressed.
+
+The data changes in Dynamics, not locally: entries are dropped when the
+transcript store sync sees a student's course history change, and
+``?refresh=true`` bypasses and rewrites them; otherwise they age out.
+"""
+import json
+import logging
+import zlib
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Bump when the cached structure changes
+FORMAT_VERSION = 1
+
+
+def _cache():
+    return caches[getattr(settings, "TRANSCRIPT_CACHE_ALIAS", "default")]
+
+
+def _key(ext_id: str) -> str:
+    return f"transcript:v{FORMAT_VERSION}:{ext_id}"
+
+
+def get(ext_id: str):
+    """Cached ``{"np_rows", "fb_rows", "p_rows", "header"}`` or ``None``."""
+    if not ext_id:
+        return None
+    try:
+        blob = _cache().get(_key(ext_id))
+        if blob is None:
+            return None
+        return json.loads(zlib.decompress(blob))
+    except Exception as e:
+        logger.warning("Transcript cache read failed for %s: %s", ext_id, str(e))
+        return None
+
+
+def store(ext_id: str, data: dict) -> bool:
+    if not ext_id:
+        return False
+    blob = zlib.compress(json.dumps(data, default=str).encode(), 6)
+    limit = int(getattr(settings, "TRANSCRIPT_CACHE_MAX_BYTES", 256 * 1024))
+    if len(blob) > limit:
+        logger.warning(
+            "Transcript for %s not cached: %d bytes compressed > %d",
+            ext_id, len(blob), limit,
+        )
+        return False
+    ttl = int(getattr(settings, "TRANSCRIPT_CACHE_TTL_SECONDS", 900))
+    try:
+        _cache().set(_key(ext_id), blob, ttl)
+        return True
+    except Exception as e:
+        logger.warning("Transcript cache write failed for %s: %s", ext_id, str(e))
+        return False
+
+
+def invalidate(*ext_ids):
+    keys = [_key(e) for e in ext_ids if e]
+    if keys:
+        try:
+            _cache().delete_many(keys)
+        except Exception as e:
+            logger.warning("Transcript cache invalidate failed: %s", str(e))
@@ -0,0 +1,298 @@
+"""Materialized transcript data: Dynamics course history kept in
+CourseHistoryRow so the transcript page reads only local indexed rows.
+
+``refresh()`` (RQ job / ``manage.py sync_transcripts``) pulls rows whose
+``modifiedon`` is past the stored watermark, with the same joins the live
+transcript queries use, and classifies each as not published, financially
+blocked or published. A periodic full pass also removes rows deleted in
+Dynamics, unless it would remove more than
+TRANSCRIPT_STORE_MAX_DELETE_FRACTION of the store. Until one full pass has completed the view keeps using the live
+FetchXML path.
+"""
+import datetime
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from crm.models import SyncState
+from crm.service import fetchxml
+from . import transcript_cache
+from .models import CourseHistoryRow
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY = "transcripts:mshied_coursehistory"
+PAGE_SIZE = 5000
+
+
+def normalize(rows):
+    """Flatten FetchXML rows: ``a.b`` -> ``a__b``, formatted values -> ``__label``."""
+    out = []
+    for r in rows or []:
+        n = {}
+        for k, v in r.items():
+            if "@OData.Community.Display.V1.FormattedValue" in k:
+                base = k.split("@", 1)[0].replace(".", "__")
+                n[f"{base}__label"] = v
+            else:
+                n[k.replace(".", "__")] = v
+        out.append(n)
+    return out
+
+
+def _coursehistory_fetch(since=None, student_ext_id=None, page: int = 1) -> str:
+    conditions = []
+    if since is not None:
+        conditions.append(
+            f"<condition attribute=\"modifiedon\" operator=\"ge\" value=\"{since.isoformat()}\" />"
+        )
+    if student_ext_id:
+        conditions.append(
+            f"<condition attribute=\"mshied_studentid\" operator=\"eq\" value=\"{student_ext_id}\" uitype=\"contact\" />"
+        )
+    filter_xml = f"<filter>{''.join(conditions)}</filter>" if conditions else ""
+    # Attribute/link set is the union of the transcript's three live queries
+    return (
+        f"<fetch page=\"{int(page)}\" count=\"{PAGE_SIZE}\">"
+        "  <entity name=\"mshied_coursehistory\">"
+        "    <attribute name=\"mshied_coursehistoryid\" />"
+        "    <attribute name=\"mshied_name\" />"
+        "    <attribute name=\"mshied_studentid\" />"
+        "    <attribute name=\"bt_publishedexamaverage\" />"
+        "    <attribute name=\"bt_publishedsemesteraverage\" />"
+        "    <attribute name=\"bt_publishedfinalaverage\" />"
+        "    <attribute name=\"bt_publishedresultcode\" />"
+        "    <attribute name=\"bt_academicyear\" />"
+        "    <attribute name=\"bt_publishedmodulestatus\" />"
+        "    <attribute name=\"bt_publishedresultstatus\" />"
+        "    <attribute name=\"bt_published\" />"
+        "    <attribute name=\"bt_financialblock\" />"
+        "    <attribute name=\"statecode\" />"
+        "    <attribute name=\"createdon\" />"
+        "    <attribute name=\"modifiedon\" />"
+        "    <order attribute=\"modifiedon\" />"
+        "    <order attribute=\"mshied_coursehistoryid\" />"
+        f"    {filter_xml}"
+        "    <link-entity name=\"product\" from=\"productid\" to=\"bt_product\" alias=\"pr\">"
+        "      <attribute name=\"msdyn_productnumber\" />"
+        "    </link-entity>"
+        "    <link-entity name=\"mshied_academicperioddetails\" from=\"mshied_academicperioddetailsid\" to=\"mshied_academicperioddetailsid\" alias=\"apd\">"
+        "      <attribute name=\"bt_programstatus\" />"
+        "      <attribute name=\"mshied_programid\" />"
+        "      <filter>"
+        "        <condition attribute=\"mshied_programid\" operator=\"not-null\" />"
+        "      </filter>"
+        "      <link-entity name=\"mshied_program\" from=\"mshied_programid\" to=\"mshied_programid\" alias=\"prog\">"
+        "        <attribute name=\"mshied_programid\" />"
+        "        <attribute name=\"mshied_name\" />"
+        "        <attribute name=\"bt_nqflevel\" />"
+        "        <attribute name=\"bt_saqaid\" />"
+        "        <attribute name=\"bt_saqaidlevel\" />"
+        "      </link-entity>"
+        "      <link-entity name=\"contact\" from=\"contactid\" to=\"mshied_studentid\" alias=\"contact\">"
+        "        <attribute name=\"msdyn_contactpersonid\" />"
+        "        <attribute name=\"msdyn_identificationnumber\" />"
+        "        <attribute name=\"firstname\" />"
+        "        <attribute name=\"lastname\" />"
+        "      </link-entity>"
+        "    </link-entity>"
+        "  </entity>"
+        "</fetch>"
+    )
+
+
+def category_for(row: dict):
+    """Map a normalized row to its transcript section, or ``None`` to drop it.
+
+    Mirrors the live FetchXML filters, where ``ne`` never matches nulls.
+    """
+    if row.get("statecode") != 0:
+        return None
+    published = row.get("bt_published")
+    if published is False:
+        return CourseHistoryRow.NOT_PUBLISHED
+    if published is not True:
+        return None
+    blocked = row.get("bt_financialblock")
+    if blocked is True:
+        return CourseHistoryRow.FINANCIAL_BLOCK
+    if blocked is False:
+        return CourseHistoryRow.PUBLISHED
+    return None
+
+
+def _dt(value):
+    return parse_datetime(value) if isinstance(value, str) else None
+
+
+def _apply(rows) -> tuple[int, int, set]:
+    """Upsert/delete one page of normalized rows; returns (upserted, deleted, students)."""
+    keep, drop, students = [], [], set()
+    for row in rows:
+        ch_id = row.get("mshied_coursehistoryid")
+        ext = row.get("_mshied_studentid_value")
+        if not ch_id:
+            continue
+        if ext:
+            students.add(ext)
+        category = category_for(row)
+        if category is None or not ext:
+            drop.append(ch_id)
+            continue
+        keep.append(CourseHistoryRow(
+            coursehistory_id=ch_id,
+            student_external_id=ext,
+            program_id=row.get("apd__mshied_programid") or row.get("prog__mshied_programid") or "",
+            category=category,
+            academic_year=str(row.get("bt_academicyear") or ""),
+            source_createdon=_dt(row.get("createdon")),
+            source_modifiedon=_dt(row.get("modifiedon")),
+            data=row,
+        ))
+    with transaction.atomic():
+        CourseHistoryRow.objects.bulk_create(
+            keep,
+            update_conflicts=True,
+            unique_fields=["coursehistory_id"],
+            update_fields=[
+                "student_external_id", "program_id", "category", "academic_year",
+                "source_createdon", "source_modifiedon", "data", "updated_at",
+            ],
+            batch_size=1000,
+        )
+        deleted = 0
+        if drop:
+            deleted, _ = CourseHistoryRow.objects.filter(coursehistory_id__in=drop).delete()
+    return len(keep), deleted, students
+
+
+def sync(since=None, student_ext_id=None) -> dict:
+    """Pull course history changed since ``since`` (all rows when ``None``)."""
+    stats = {
+        "fetched": 0, "upserted": 0, "deleted": 0,
+        "students": set(), "ids": set(), "high_water": None, "error": None,
+        "delete_skipped": 0,
+    }
+    page = 1
+    while True:
+        res = fetchxml("mshied_coursehistory", _coursehistory_fetch(since, student_ext_id, page))
+        if res.get("unavailable"):
+            stats["error"] = "Dynamics unavailable"
+            break
+        rows = normalize(res.get("value"))
+        stats["fetched"] += len(rows)
+        upserted, deleted, students = _apply(rows)
+        stats["upserted"] += upserted
+        stats["deleted"] += deleted
+        stats["students"] |= students
+        for row in rows:
+            if row.get("mshied_coursehistoryid"):
+                stats["ids"].add(row["mshied_coursehistoryid"])
+            mod = _dt(row.get("modifiedon"))
+            if mod and (stats["high_water"] is None or mod > stats["high_water"]):
+                stats["high_water"] = mod
+        # A full page may be followed by more; the morerecords annotation is
+        # only sent when requested, so don't rely on it
+        if len(rows) < PAGE_SIZE:
+            break
+        page += 1
+    return stats
+
+
+def _full_sync_due(state) -> bool:
+    if not state.watermark or not state.last_full_sync_at:
+        return True
+    hours = float(getattr(settings, "TRANSCRIPT_STORE_FULL_SYNC_HOURS", 24))
+    return (timezone.now() - state.last_full_sync_at).total_seconds() >= hours * 3600
+
+
+def refresh(full: bool = False) -> dict:
+    """Incremental (or due/forced full) refresh of the whole store."""
+    state, _ = SyncState.objects.get_or_create(key=STATE_KEY)
+    since = None
+    if not (full or _full_sync_due(state)):
+        try:
+            lookback = int(getattr(settings, "TRANSCRIPT_STORE_LOOKBACK_SECONDS", 300))
+            since = datetime.datetime.fromisoformat(state.watermark) - datetime.timedelta(seconds=lookback)
+        except (TypeError, ValueError):
+            since = None
+    stats = sync(since=since)
+    students = stats["students"]
+    if stats["error"] is None:
+        if since is None:
+            # Rows Dynamics no longer returns at all were deleted there
+            gone = {}
+            for ch_id, ext in CourseHistoryRow.objects.values_list(
+                "coursehistory_id", "student_external_id"
+            ).iterator():
+                if ch_id not in stats["ids"]:
+                    gone[ch_id] = ext
+            stored = CourseHistoryRow.objects.count()
+            max_frac = float(getattr(settings, "TRANSCRIPT_STORE_MAX_DELETE_FRACTION", 0.2))
+            if stored and len(gone) / stored > max_frac:
+                # A truncated read must not wipe the store
+                logger.warning(
+                    "Transcript full sync would delete %d/%d rows (over %s); "
+                    "skipping deletion and retrying the full pass next run",
+                    len(gone), stored, max_frac,
+                )
+                stats["delete_skipped"] = len(gone)
+            else:
+                students |= set(gone.values())
+                missing = list(gone)
+                for i in range(0, len(missing), 1000):
+                    stats["deleted"] += CourseHistoryRow.objects.filter(
+                        coursehistory_id__in=missing[i:i + 1000]
+                    ).delete()[0]
+        now = timezone.now()
+        fields = ["last_run_at"]
+        state.last_run_at = now
+        if stats["high_water"]:
+            state.watermark = stats["high_water"].isoformat()
+            fields.append("watermark")
+        if since is None and not stats.get("delete_skipped"):
+            state.last_full_sync_at = now
+            fields.append("last_full_sync_at")
+        state.save(update_fields=fields)
+    transcript_cache.invalidate(*students)
+    stats["full"] = since is None
+    return stats
+
+
+def refresh_student(ext_id: str) -> bool:
+    """Re-pull every course history row of one student (transcript ?refresh=true)."""
+    stats = sync(student_ext_id=ext_id)
+    if stats["error"] is not None:
+        return False
+    # Rows that no longer exist for this student
+    CourseHistoryRow.objects.filter(student_external_id=ext_id).exclude(
+        coursehistory_id__in=stats["ids"]
+    ).delete()
+    transcript_cache.invalidate(ext_id)
+    return True
+
+
+def is_ready() -> bool:
+    """True once a full pass has populated the store."""
+    return SyncState.objects.filter(
+        key=STATE_KEY, last_full_sync_at__isnull=False
+    ).exists()
+
+
+def rows_for(ext_id: str, program_id: str | None = None) -> dict:
+    """``{"np_rows", "fb_rows", "p_rows"}`` for a student, newest year first."""
+    qs = CourseHistoryRow.objects.filter(student_external_id=ext_id)
+    if program_id is not None:
+        qs = qs.filter(program_id=program_id)
+    out = {"np_rows": [], "fb_rows": [], "p_rows": []}
+    names = {
+        CourseHistoryRow.NOT_PUBLISHED: "np_rows",
+        CourseHistoryRow.FINANCIAL_BLOCK: "fb_rows",
+        CourseHistoryRow.PUBLISHED: "p_rows",
+    }
+    for category, data in qs.order_by(
+        "-academic_year", "-source_createdon"
+    ).values_list("category", "data"):
+        out[names[category]].append(data)
+    return out
@@ -3,19 +3,26 @@ from django.http import HttpResponseForbidden
 from django.shortcuts import render
 from django.conf import settings
 from students.models import Student
-from students.permissions import parent_can_view_student
-from students.fabric import fetch_atrisk_for_student, fetch_contact_by_id as fabric_contact_by_id
-from crm.service import fetchxml, get_contact_by_id
+from students.context import get_parent_ctx
+from students.fabric import (
+    count_atrisk_for_student,
+    fetch_atrisk_facets,
+    fetch_atrisk_page,
+    fetch_contact_by_id as fabric_contact_by_id,
+)
+from crm.service import fetchxml_many, get_contact_by_id
+from . import programs, transcript_cache, transcript_store
 
 
 @login_required
 def index(request):
-    sid = request.session.get("active_student_id")
+    pctx = get_parent_ctx(request)
+    sid = pctx.active_student_id
     student = None
     student_number = ""
     atrisk_count = None
     if sid:
-        student = Student.objects.filter(id=sid).first()
+        student = pctx.active_student
         contact = None
         if student and "fabric" in settings.DATABASES and student.external_student_id:
             try:
@@ -31,8 +38,7 @@ def index(request):
             student_number = contact.get("msdyn_contactpersonid") or ""
         if "fabric" in settings.DATABASES and student and student.external_student_id:
             try:
-                rows = fetch_atrisk_for_student(student.external_student_id, limit=500)
-                atrisk_count = len(rows or [])
+                atrisk_count = count_atrisk_for_student(student.external_student_id)
             except Exception:
                 atrisk_count = None
     ctx = {
@@ -45,8 +51,151 @@ def index(request):
     return render(request, "academics/index.html", ctx)
 
 
+def _live_course_history(ext_id, program_id):
+    """Live ``[np, fb, p]`` FetchXML results for one student and program."""
+    ch_np = (
+        "<fetch>"
+        "  <entity name=\"mshied_coursehistory\">"
+        "    <attribute name=\"mshied_name\" />"
+        "    <attribute name=\"mshied_studentid\" />"
+        "    <attribute name=\"bt_academicyear\" />"
+        "    <order attribute=\"bt_academicyear\" descending=\"true\" />"
+        "    <order attribute=\"createdon\" descending=\"true\" />"
+        "    <filter>"
+        f"      <condition attribute=\"mshied_studentid\" operator=\"eq\" value=\"{ext_id}\" uitype=\"contact\" />"
+        "      <condition attribute=\"bt_published\" operator=\"ne\" value=\"1\" />"
+        "      <condition attribute=\"statecode\" operator=\"eq\" value=\"0\" />"
+        "    </filter>"
+        "    <link-entity name=\"product\" from=\"productid\" to=\"bt_product\" alias=\"pr\">"
+        "      <attribute name=\"msdyn_productnumber\" />"
+        "    </link-entity>"
+        "    <link-entity name=\"mshied_academicperioddetails\" from=\"mshied_academicperioddetailsid\" to=\"mshied_academicperioddetailsid\" alias=\"apd\">"
+        "      <attribute name=\"bt_programstatus\" />"
+        "      <attribute name=\"mshied_programid\" />"
+        "      <filter>"
+        "        <condition attribute=\"mshied_programid\" operator=\"not-null\" />"
+        f"        <condition attribute=\"mshied_programid\" operator=\"eq\" value=\"{program_id}\" />"
+        "      </filter>"
+        "      <link-entity name=\"mshied_program\" from=\"mshied_programid\" to=\"mshied_programid\" alias=\"prog\">"
+        "        <attribute name=\"mshied_name\" />"
+        "        <attribute name=\"bt_nqflevel\" />"
+        "        <attribute name=\"bt_saqaid\" />"
+        "        <attribute name=\"bt_saqaidlevel\" />"
+        "      </link-entity>"
+        "    </link-entity>"
+        "  </entity>"
+        "</fetch>"
+    )
+    ch_fb = (
+        "<fetch>"
+        "  <entity name=\"mshied_coursehistory\">"
+        "    <attribute name=\"mshied_name\" />"
+        "    <attribute name=\"mshied_studentid\" />"
+        "    <attribute name=\"bt_publishedresultcode\" />"
+        "    <attribute name=\"bt_academicyear\" />"
+        "    <attribute name=\"bt_publishedresultstatus\" />"
+        "    <order attribute=\"bt_academicyear\" descending=\"true\" />"
+        "    <order attribute=\"createdon\" descending=\"true\" />"
+        "    <filter>"
+        f"      <condition attribute=\"mshied_studentid\" operator=\"eq\" value=\"{ext_id}\" uitype=\"contact\" />"
+        "      <condition attribute=\"bt_financialblock\" operator=\"eq\" value=\"1\" />"
+        "      <condition attribute=\"bt_published\" operator=\"eq\" value=\"1\" />"
+        "      <condition attribute=\"statecode\" operator=\"eq\" value=\"0\" />"
+        "    </filter>"
+        "    <link-entity name=\"product\" from=\"productid\" to=\"bt_product\" alias=\"pr\">"
+        "      <attribute name=\"msdyn_productnumber\" />"
+        "    </link-entity>"
+        "    <link-entity name=\"mshied_academicperioddetails\" from=\"mshied_academicperioddetailsid\" to=\"mshied_academicperioddetailsid\" alias=\"apd\">"
+        "      <attribute name=\"bt_programstatus\" />"
+        "      <attribute name=\"mshied_programid\" />"
+        "      <filter>"
+        "        <condition attribute=\"mshied_programid\" operator=\"not-null\" />"
+        f"        <condition attribute=\"mshied_programid\" operator=\"eq\" value=\"{program_id}\" />"
+        "      </filter>"
+        "      <link-entity name=\"mshied_program\" from=\"mshied_programid\" to=\"mshied_programid\" alias=\"prog\">"
+        "        <attribute name=\"mshied_name\" />"
+        "        <attribute name=\"bt_nqflevel\" />"
+        "        <attribute name=\"bt_saqaid\" />"
+        "        <attribute name=\"bt_saqaidlevel\" />"
+        "      </link-entity>"
+        "    </link-entity>"
+        "  </entity>"
+        "</fetch>"
+    )
+    ch_p = (
+        "<fetch>"
+        "  <entity name=\"mshied_coursehistory\">"
+        "    <attribute name=\"mshied_name\" />"
+        "    <attribute name=\"mshied_studentid\" />"
+        "    <attribute name=\"bt_publishedexamaverage\" />"
+        "    <attribute name=\"bt_publishedsemesteraverage\" />"
+        "    <attribute name=\"bt_publishedfinalaverage\" />"
+        "    <attribute name=\"bt_publishedresultcode\" />"
+        "    <attribute name=\"bt_academicyear\" />"
+        "    <attribute name=\"bt_publishedmodulestatus\" />"
+        "    <attribute name=\"bt_publishedresultstatus\" />"
+        "    <order attribute=\"bt_academicyear\" descending=\"true\" />"
+        "    <order attribute=\"createdon\" descending=\"true\" />"
+        "    <filter>"
+        f"      <condition attribute=\"mshied_studentid\" operator=\"eq\" value=\"{ext_id}\" uitype=\"contact\" />"
+        "      <condition attribute=\"bt_financialblock\" operator=\"ne\" value=\"1\" />"
+        "      <condition attribute=\"bt_published\" operator=\"eq\" value=\"1\" />"
+        "      <condition attribute=\"statecode\" operator=\"eq\" value=\"0\" />"
+        "    </filter>"
+        "    <link-entity name=\"product\" from=\"productid\" to=\"bt_product\" alias=\"pr\">"
+        "      <attribute name=\"msdyn_productnumber\" />"
+        "    </link-entity>"
+        "    <link-entity name=\"mshied_academicperioddetails\" from=\"mshied_academicperioddetailsid\" to=\"mshied_academicperioddetailsid\" alias=\"apd\">"
+        "      <attribute name=\"bt_programstatus\" />"
+        "      <attribute name=\"mshied_programid\" />"
+        "      <filter>"
+        "        <condition attribute=\"mshied_programid\" operator=\"not-null\" />"
+        f"        <condition attribute=\"mshied_programid\" operator=\"eq\" value=\"{program_id}\" />"
+        "      </filter>"
+        "      <link-entity name=\"mshied_program\" from=\"mshied_programid\" to=\"mshied_programid\" alias=\"prog\">"
+        "        <attribute name=\"mshied_programid\" />"
+        "        <attribute name=\"mshied_name\" />"
+        "        <attribute name=\"bt_nqflevel\" />"
+        "        <attribute name=\"bt_saqaid\" />"
+        "        <attribute name=\"bt_saqaidlevel\" />"
+        "      </link-entity>"
+        "      <link-entity name=\"contact\" from=\"contactid\" to=\"mshied_studentid\" alias=\"contact\">"
+        "        <attribute name=\"msdyn_contactpersonid\" />"
+        "        <attribute name=\"msdyn_identificationnumber\" />"
+        "        <attribute name=\"firstname\" />"
+        "        <attribute name=\"lastname\" />"
+        "      </link-entity>"
+        "    </link-entity>"
+        "  </entity>"
+        "</fetch>"
+    )
+    # Independent of each other; fetched concurrently
+    return fetchxml_many([
+        ("mshied_coursehistory", ch_np),
+        ("mshied_coursehistory", ch_fb),
+        ("mshied_coursehistory", ch_p),
+    ])
+
+
+def _transcript_header(p_rows, program_name):
+    header = {}
+    if p_rows:
+        h = p_rows[0]
+        header = {
+            "name": f"{h.get('contact__firstname', '')} {h.get('contact__lastname', '')}".strip(),
+            "student_number": h.get("contact__msdyn_contactpersonid"),
+            "id_number": h.get("contact__msdyn_identificationnumber"),
+            "program_status": h.get("apd__bt_programstatus__label"),
+            "program_name": h.get("prog__mshied_name") or program_name,
+        }
+    else:
+        header = {"program_name": program_name}
+    return header
+
+
 @login_required
 def transcript(request):
+    pctx = get_parent_ctx(request)
     ext_id = request.GET.get("contactid") or request.GET.get("studentid")
     student = None
     if ext_id:
@@ -54,7 +203,7 @@ def transcript(request):
         if not student:
             return HttpResponseForbidden("forbidden")
     else:
-        sid = request.session.get("active_student_id")
+        sid = pctx.active_student_id
         if not sid:
             ctx = {
                 "active_nav": "academics",
@@ -66,7 +215,7 @@ def transcript(request):
                 "no_student": True,
             }
             return render(request, "academics/transcript.html", ctx)
-        student = Student.objects.filter(id=sid).first()
+        student = pctx.active_student
         if not student:
             ctx = {
                 "active_nav": "academics",
@@ -79,7 +228,7 @@ def transcript(request):
             }
             return render(request, "academics/transcript.html", ctx)
         ext_id = student.external_student_id
-    if not parent_can_view_student(request.user, student.id):
+    if not pctx.can_view(student.id):
         return HttpResponseForbidden("forbidden")
 
     # Check for financial block
@@ -108,192 +257,43 @@ def transcript(request):
                  "reason": "Financial Block"
              })
 
-    # Caching Logic
-    cache_key = f"transcript_data_{ext_id}"
+    # Read the local transcript store once it is populated; until then use
+    # live FetchXML through the shared per-student cache.
+    request.session.pop(f"transcript_data_{ext_id}", None)
     refresh = request.GET.get("refresh") == "true"
-    cached_data = request.session.get(cache_key)
-
-    if cached_data and not refresh:
-        np_rows = cached_data.get("np_rows", [])
-        fb_rows = cached_data.get("fb_rows", [])
-        p_rows = cached_data.get("p_rows", [])
-        header = cached_data.get("header", {})
+    partial = False
+    if transcript_store.is_ready():
+        if refresh:
+            partial = not transcript_store.refresh_student(ext_id)
+        program_id, program_name, unavailable = programs.program_for(student, refresh)
+        partial = partial or unavailable
+        # Without the program lookup show every program rather than nothing
+        rows = transcript_store.rows_for(ext_id, None if unavailable else program_id)
+        np_rows, fb_rows, p_rows = rows["np_rows"], rows["fb_rows"], rows["p_rows"]
+        header = _transcript_header(p_rows, program_name)
     else:
-        f1 = (
-            "<fetch distinct=\"true\">"
-            "  <entity name=\"mshied_academicperioddetails\">"
-            "    <filter>"
-            f"      <condition attribute=\"mshied_studentid\" operator=\"eq\" value=\"{ext_id}\" />"
-            "    </filter>"
-            "    <link-entity name=\"mshied_program\" from=\"mshied_programid\" to=\"mshied_programid\" alias=\"prog\">"
-            "      <attribute name=\"mshied_programid\" />"
-            "      <attribute name=\"mshied_name\" />"
-            "    </link-entity>"
-            "  </entity>"
-            "</fetch>"
-        )
-        r1 = fetchxml("mshied_academicperioddetails", f1)
-        program_id = None
-        program_name = None
-        for row in r1.get("value", []):
-            program_id = program_id or row.get("prog.mshied_programid")
-            program_name = program_name or row.get("prog.mshied_name")
-        if not program_id:
-            program_id = ""
-
-        ch_np = (
-            "<fetch>"
-            "  <entity name=\"mshied_coursehistory\">"
-            "    <attribute name=\"mshied_name\" />"
-            "    <attribute name=\"mshied_studentid\" />"
-            "    <attribute name=\"bt_academicyear\" />"
-            "    <order attribute=\"bt_academicyear\" descending=\"true\" />"
-            "    <order attribute=\"createdon\" descending=\"true\" />"
-            "    <filter>"
-            f"      <condition attribute=\"mshied_studentid\" operator=\"eq\" value=\"{ext_id}\" uitype=\"contact\" />"
-            "      <condition attribute=\"bt_published\" operator=\"ne\" value=\"1\" />"
-            "      <condition attribute=\"statecode\" operator=\"eq\" value=\"0\" />"
-            "    </filter>"
-            "    <link-entity name=\"product\" from=\"productid\" to=\"bt_product\" alias=\"pr\">"
-            "      <attribute name=\"msdyn_productnumber\" />"
-            "    </link-entity>"
-            "    <link-entity name=\"mshied_academicperioddetails\" from=\"mshied_academicperioddetailsid\" to=\"mshied_academicperioddetailsid\" alias=\"apd\">"
-            "      <attribute name=\"bt_programstatus\" />"
-            "      <attribute name=\"mshied_programid\" />"
-            "      <filter>"
-            "        <condition attribute=\"mshied_programid\" operator=\"not-null\" />"
-            f"        <condition attribute=\"mshied_programid\" operator=\"eq\" value=\"{program_id}\" />"
-            "      </filter>"
-            "      <link-entity name=\"mshied_program\" from=\"mshied_programid\" to=\"mshied_programid\" alias=\"prog\">"
-            "        <attribute name=\"mshied_name\" />"
-            "        <attribute name=\"bt_nqflevel\" />"
-            "        <attribute name=\"bt_saqaid\" />"
-            "        <attribute name=\"bt_saqaidlevel\" />"
-            "      </link-entity>"
-            "    </link-entity>"
-            "  </entity>"
-            "</fetch>"
-        )
-        ch_fb = (
-            "<fetch>"
-            "  <entity name=\"mshied_coursehistory\">"
-            "    <attribute name=\"mshied_name\" />"
-            "    <attribute name=\"mshied_studentid\" />"
-            "    <attribute name=\"bt_publishedresultcode\" />"
-            "    <attribute name=\"bt_academicyear\" />"
-            "    <attribute name=\"bt_publishedresultstatus\" />"
-            "    <order attribute=\"bt_academicyear\" descending=\"true\" />"
-            "    <order attribute=\"createdon\" descending=\"true\" />"
-            "    <filter>"
-            f"      <condition attribute=\"mshied_studentid\" operator=\"eq\" value=\"{ext_id}\" uitype=\"contact\" />"
-            "      <condition attribute=\"bt_financialblock\" operator=\"eq\" value=\"1\" />"
-            "      <condition attribute=\"bt_published\" operator=\"eq\" value=\"1\" />"
-            "      <condition attribute=\"statecode\" operator=\"eq\" value=\"0\" />"
-            "    </filter>"
-            "    <link-entity name=\"product\" from=\"productid\" to=\"bt_product\" alias=\"pr\">"
-            "      <attribute name=\"msdyn_productnumber\" />"
-            "    </link-entity>"
-            "    <link-entity name=\"mshied_academicperioddetails\" from=\"mshied_academicperioddetailsid\" to=\"mshied_academicperioddetailsid\" alias=\"apd\">"
-            "      <attribute name=\"bt_programstatus\" />"
-            "      <attribute name=\"mshied_programid\" />"
-            "      <filter>"
-            "        <condition attribute=\"mshied_programid\" operator=\"not-null\" />"
-            f"        <condition attribute=\"mshied_programid\" operator=\"eq\" value=\"{program_id}\" />"
-            "      </filter>"
-            "      <link-entity name=\"mshied_program\" from=\"mshied_programid\" to=\"mshied_programid\" alias=\"prog\">"
-            "        <attribute name=\"mshied_name\" />"
-            "        <attribute name=\"bt_nqflevel\" />"
-            "        <attribute name=\"bt_saqaid\" />"
-            "        <attribute name=\"bt_saqaidlevel\" />"
-            "      </link-entity>"
-            "    </link-entity>"
-            "  </entity>"
-            "</fetch>"
-        )
-        ch_p = (
-            "<fetch>"
-            "  <entity name=\"mshied_coursehistory\">"
-            "    <attribute name=\"mshied_name\" />"
-            "    <attribute name=\"mshied_studentid\" />"
-            "    <attribute name=\"bt_publishedexamaverage\" />"
-            "    <attribute name=\"bt_publishedsemesteraverage\" />"
-            "    <attribute name=\"bt_publishedfinalaverage\" />"
-            "    <attribute name=\"bt_publishedresultcode\" />"
-            "    <attribute name=\"bt_academicyear\" />"
-            "    <attribute name=\"bt_publishedmodulestatus\" />"
-            "    <attribute name=\"bt_publishedresultstatus\" />"
-            "    <order attribute=\"bt_academicyear\" descending=\"true\" />"
-            "    <order attribute=\"createdon\" descending=\"true\" />"
-            "    <filter>"
-            f"      <condition attribute=\"mshied_studentid\" operator=\"eq\" value=\"{ext_id}\" uitype=\"contact\" />"
-            "      <condition attribute=\"bt_financialblock\" operator=\"ne\" value=\"1\" />"
-            "      <condition attribute=\"bt_published\" operator=\"eq\" value=\"1\" />"
-            "      <condition attribute=\"statecode\" operator=\"eq\" value=\"0\" />"
-            "    </filter>"
-            "    <link-entity name=\"product\" from=\"productid\" to=\"bt_product\" alias=\"pr\">"
-            "      <attribute name=\"msdyn_productnumber\" />"
-            "    </link-entity>"
-            "    <link-entity name=\"mshied_academicperioddetails\" from=\"mshied_academicperioddetailsid\" to=\"mshied_academicperioddetailsid\" alias=\"apd\">"
-            "      <attribute name=\"bt_programstatus\" />"
-            "      <attribute name=\"mshied_programid\" />"
-            "      <filter>"
-            "        <condition attribute=\"mshied_programid\" operator=\"not-null\" />"
-            f"        <condition attribute=\"mshied_programid\" operator=\"eq\" value=\"{program_id}\" />"
-            "      </filter>"
-            "      <link-entity name=\"mshied_program\" from=\"mshied_programid\" to=\"mshied_programid\" alias=\"prog\">"
-            "        <attribute name=\"mshied_programid\" />"
-            "        <attribute name=\"mshied_name\" />"
-            "        <attribute name=\"bt_nqflevel\" />"
-            "        <attribute name=\"bt_saqaid\" />"
-            "        <attribute name=\"bt_saqaidlevel\" />"
-            "      </link-entity>"
-            "      <link-entity name=\"contact\" from=\"contactid\" to=\"mshied_studentid\" alias=\"contact\">"
-            "        <attribute name=\"msdyn_contactpersonid\" />"
-            "        <attribute name=\"msdyn_identificationnumber\" />"
-            "        <attribute name=\"firstname\" />"
-            "        <attribute name=\"lastname\" />"
-            "      </link-entity>"
-            "    </link-entity>"
-            "  </entity>"
-            "</fetch>"
-        )
-
-        def normalize(rows):
-            out = []
-            for r in rows or []:
-                n = {}
-                for k, v in r.items():
-                    if "@OData.Community.Display.V1.FormattedValue" in k:
-                        base = k.split("@", 1)[0].replace(".", "__")
-                        n[f"{base}__label"] = v
-                    else:
-                        n[k.replace(".", "__")] = v
-                out.append(n)
-            return out
-
-        np_rows = normalize(fetchxml("mshied_coursehistory", ch_np).get("value"))
-        fb_rows = normalize(fetchxml("mshied_coursehistory", ch_fb).get("value"))
-        p_rows = normalize(fetchxml("mshied_coursehistory", ch_p).get("value"))
-
-        header = {}
-        if p_rows:
-            h = p_rows[0]
-            header = {
-                "name": f"{h.get('contact__firstname', '')} {h.get('contact__lastname', '')}".strip(),
-                "student_number": h.get("contact__msdyn_contactpersonid"),
-                "id_number": h.get("contact__msdyn_identificationnumber"),
-                "program_status": h.get("apd__bt_programstatus__label"),
-                "program_name": h.get("prog__mshied_name") or program_name,
-            }
+        cached_data = None if refresh else transcript_cache.get(ext_id)
+        if cached_data:
+            np_rows = cached_data.get("np_rows", [])
+            fb_rows = cached_data.get("fb_rows", [])
+            p_rows = cached_data.get("p_rows", [])
+            header = cached_data.get("header", {})
         else:
-            header = {"program_name": program_name}
-        
-        request.session[cache_key] = {
-            "np_rows": np_rows,
-            "fb_rows": fb_rows,
-            "p_rows": p_rows,
-            "header": header,
-        }
+            program_id, program_name, partial = programs.program_for(student, refresh)
+            results = _live_course_history(ext_id, program_id)
+            partial = partial or any(r.get("unavailable") for r in results)
+            np_rows, fb_rows, p_rows = (
+                transcript_store.normalize(r.get("value")) for r in results
+            )
+            header = _transcript_header(p_rows, program_name)
+            # Don't pin an incomplete transcript (timeout/open circuit) in cache
+            if not partial:
+                transcript_cache.store(ext_id, {
+                    "np_rows": np_rows,
+                    "fb_rows": fb_rows,
+                    "p_rows": p_rows,
+                    "header": header,
+                })
 
     ctx = {
         "active_nav": "academics",
@@ -302,12 +302,14 @@ def transcript(request):
         "np_rows": np_rows,
         "fb_rows": fb_rows,
         "p_rows": p_rows,
+        "partial": partial,
     }
     return render(request, "academics/transcript.html", ctx)
 
 
 @login_required
 def atrisk(request):
+    pctx = get_parent_ctx(request)
     ext_id = request.GET.get("contactid") or request.GET.get("studentid")
     student = None
     if ext_id:
@@ -315,7 +317,7 @@ def atrisk(request):
         if not student:
             return HttpResponseForbidden("forbidden")
     else:
-        sid = request.session.get("active_student_id")
+        sid = pctx.active_student_id
         if not sid:
             ctx = {
                 "active_nav": "academics",
@@ -324,7 +326,7 @@ def atrisk(request):
                 "no_student": True,
             }
             return render(request, "academics/atrisk.html", ctx)
-        student = Student.objects.filter(id=sid).first()
+        student = pctx.active_student
         if not student:
             ctx = {
                 "active_nav": "academics",
@@ -333,48 +335,49 @@ def atrisk(request):
                 "no_student": True,
             }
             return render(request, "academics/atrisk.html", ctx)
-    if not parent_can_view_student(request.user, student.id):
+    if not pctx.can_view(student.id):
         return HttpResponseForbidden("forbidden")
 
-    rows = []
+    req_year = request.GET.get("year")
+    req_block = request.GET.get("block")
+    q = (request.GET.get("q") or "").strip()
+    after = request.GET.get("after")
+
+    # Filtering, search and paging run in Fabric; only this page is fetched
+    page = {"rows": [], "next_cursor": None}
+    facets = {"years": [], "blocks": []}
     if "fabric" in settings.DATABASES and student.external_student_id:
         try:
-            rows = fetch_atrisk_for_student(student.external_student_id)
+            page = fetch_atrisk_page(
+                student.external_student_id,
+                year=req_year,
+                block=req_block,
+                q=q,
+                after=after,
+                page_size=getattr(settings, "ATRISK_PAGE_SIZE", 50),
+            )
+            facets = fetch_atrisk_facets(student.external_student_id)
         except Exception:
-            rows = []
-
-    distinct_years = sorted({str(r.get("edv_year")) for r in rows if r.get("edv_year")}, reverse=True)
-    distinct_blocks = sorted({str(r.get("edv_block")) for r in rows if r.get("edv_block")})
-
-    req_year = request.GET.get("year")
-    req_block = request.GET.get("block")
-    q = (request.GET.get("q") or "").lower().strip()
+            pass
 
-    filtered_rows = []
-    for r in rows:
-        # Year filter
-        if req_year and str(r.get("edv_year")) != req_year:
-            continue
-        # Block filter
-        if req_block and str(r.get("edv_block")) != req_block:
-            continue
-        # Search filter
-        if q:
-            searchable = [
-                str(r.get("edv_modulecode") or ""),
-                str(r.get("edv_primaryreason") or ""),
-                str(r.get("edv_secondaryreason") or ""),
-                str(r.get("edv_comments") or ""),
-            ]
-            if not any(q in s.lower() for s in searchable):
-                continue
-        filtered_rows.append(r)
+    next_query = None
+    if page["next_cursor"]:
+        params = request.GET.copy()
+        params["after"] = page["next_cursor"]
+        next_query = params.urlencode()
+    first_query = None
+    if after:
+        params = request.GET.copy()
+        params.pop("after", None)
+        first_query = params.urlencode()
 
     ctx = {
         "active_nav": "academics",
         "student": student,
-        "rows": filtered_rows,
-        "distinct_years": distinct_years,
-        "distinct_blocks": distinct_blocks,
+        "rows": page["rows"],
+        "distinct_years": facets["years"],
+        "distinct_blocks": facets["blocks"],
+        "next_query": next_query,
+        "first_query": first_query,
     }
     return render(request, "academics/atrisk.html", ctx)
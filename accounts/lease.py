@@ -0,0 +1,175 @@
+"""Identity lease: how fresh a parent's validated student links are.
+
+Within the soft TTL (IDENTITY_LEASE_TTL_SECONDS) links are trusted as-is.
+Between the soft and hard TTL (IDENTITY_LEASE_HARD_TTL_SECONDS) requests
+keep using the existing ParentStudentLink rows while an RQ job revalidates
+in the background. Past the hard TTL, or when the user was never validated,
+validation runs synchronously.
+
+A validation that finds no students records a negative lease instead (one
+that could not reach Fabric/Dynamics records nothing); it is
+not retried until IDENTITY_NEGATIVE_LEASE_BASE_SECONDS has passed, doubling
+per consecutive miss up to IDENTITY_NEGATIVE_LEASE_MAX_SECONDS. The
+students:refresh_links view still forces an immediate revalidation.
+"""
+import datetime
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+
+
+def soft_ttl() -> int:
+    return int(getattr(settings, "IDENTITY_LEASE_TTL_SECONDS", 3600))
+
+
+def hard_ttl() -> int:
+    return max(
+        soft_ttl(),
+        int(getattr(settings, "IDENTITY_LEASE_HARD_TTL_SECONDS", 4 * 3600)),
+    )
+
+
+def lease_state(user) -> str:
+    if not user.last_validated_at:
+        return EXPIRED
+    age = (timezone.now() - user.last_validated_at).total_seconds()
+    if age <= soft_ttl():
+        return FRESH
+    if age <= hard_ttl():
+        return STALE
+    return EXPIRED
+
+
+def negative_ttl(attempts: int) -> int:
+    base = int(getattr(settings, "IDENTITY_NEGATIVE_LEASE_BASE_SECONDS", 300))
+    cap = int(getattr(settings, "IDENTITY_NEGATIVE_LEASE_MAX_SECONDS", 6 * 3600))
+    return min(cap, base * 2 ** max(0, min(attempts, 16) - 1))
+
+
+def negative_lease_active(user) -> bool:
+    """True while a recent "no matched students" result should be reused."""
+    if not user.last_unmatched_at or not user.unmatched_attempts:
+        return False
+    age = (timezone.now() - user.last_unmatched_at).total_seconds()
+    return age < negative_ttl(user.unmatched_attempts)
+
+
+def record_validation(user, matched: bool):
+    """Update the negative lease after a validate_parent run."""
+    if matched:
+        if user.unmatched_attempts or user.last_unmatched_at:
+            user.unmatched_attempts = 0
+            user.last_unmatched_at = None
+            user.save(update_fields=["unmatched_attempts", "last_unmatched_at"])
+        return
+    user.unmatched_attempts = min((user.unmatched_attempts or 0) + 1, 32767)
+    user.last_unmatched_at = timezone.now()
+    user.save(update_fields=["unmatched_attempts", "last_unmatched_at"])
+    logger.info(
+        "No students matched for user %s; next validation in %ss",
+        user.pk, negative_ttl(user.unmatched_attempts),
+    )
+
+
+def schedule_revalidation(user) -> bool:
+    """Queue a background revalidation unless one was queued recently."""
+    key = f"lease_revalidate:{user.pk}"
+    debounce = int(getattr(settings, "IDENTITY_LEASE_REVALIDATE_DEBOUNCE_SECONDS", 300))
+    if not cache.add(key, 1, timeout=debounce):
+        return False
+    try:
+        from jobs.tasks import revalidate_parent_links
+
+        revalidate_parent_links.delay(user.pk)
+        return True
+    except Exception as e:
+        # Queue unavailable: keep serving the existing links until hard TTL
+        cache.delete(key)
+        logger.warning(
+            "Could not queue revalidation for user %s: %s", user.pk, str(e)
+        )
+        return False
+
+
+def _email_job_key(user_id) -> str:
+    return f"lease_email_revalidate:{user_id}"
+
+
+def _email_job_pending(connection, scheduler, user_id) -> bool:
+    """True while the user's last email revalidation job has not started."""
+    from rq.exceptions import NoSuchJobError
+    from rq.job import Job, JobStatus
+
+    job_id = connection.get(_email_job_key(user_id))
+    if not job_id:
+        return False
+    job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+    if job_id in scheduler:
+        return True
+    try:
+        status = Job.fetch(job_id, connection=connection).get_status()
+    except NoSuchJobError:
+        return False
+    return status in (JobStatus.QUEUED, JobStatus.DEFERRED, JobStatus.SCHEDULED)
+
+
+def schedule_email_revalidation(user) -> bool:
+    """Queue one delayed revalidation after an email address change.
+
+    Events arriving before the job starts collapse into that single run
+    (EMAIL_REVALIDATE_DELAY_SECONDS). The debounce is the queued job itself,
+    tracked in the RQ Redis, so it holds across workers whatever the Django
+    cache backend. If nothing can be queued the lease is expired instead,
+    so the next request validates synchronously.
+    """
+    delay = int(getattr(settings, "EMAIL_REVALIDATE_DELAY_SECONDS", 15))
+    try:
+        from django_rq import get_scheduler
+        from jobs.tasks import revalidate_parent_links
+
+        scheduler = get_scheduler("default")
+        connection = scheduler.connection
+        if _email_job_pending(connection, scheduler, user.pk):
+            return False
+        job = scheduler.enqueue_in(
+            datetime.timedelta(seconds=delay),
+            revalidate_parent_links,
+            user.pk,
+        )
+        # Outlive the delay so a slow scheduler cannot let duplicates through
+        connection.set(_email_job_key(user.pk), job.id, ex=delay + 300)
+        return True
+    except Exception as e:
+        logger.warning(
+            "Could not queue email revalidation for user %s: %s", user.pk, str(e)
+        )
+        type(user).objects.filter(pk=user.pk).update(last_validated_at=None)
+        return False
+
+
+def ensure_identity_lease(user) -> bool:
+    """Make sure the user's lease is usable for this request.
+
+    Returns the result of a synchronous validation when the lease had
+    expired, otherwise True (fresh, or stale with a refresh queued). While a
+    negative lease is active an expired user gets False without validating.
+    """
+    state = lease_state(user)
+    if state == FRESH:
+        return True
+    if state == STALE:
+        if not negative_lease_active(user):
+            schedule_revalidation(user)
+        return True
+    if negative_lease_active(user):
+        return False
+    from crm.service import validate_parent
+
+    return validate_parent(user)
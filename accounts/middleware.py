@@ -1,6 +1,4 @@
-from django.utils import timezone
-from django.conf import settings
-from crm.service import validate_parent
+from students.context import get_parent_ctx
 
 class IdentityLeaseMiddleware:
     def __init__(self, get_response):
@@ -9,7 +7,8 @@ class IdentityLeaseMiddleware:
     def __call__(self, request):
         user = getattr(request, "user", None)
         if user and user.is_authenticated and getattr(user, "is_parent", False):
-            ttl = getattr(settings, "IDENTITY_LEASE_TTL_SECONDS", 3600)
-            if not user.last_validated_at or (timezone.now() - user.last_validated_at).total_seconds() > ttl:
-                validate_parent(user)
+            # Fresh: nothing to do. Stale: served from existing links while a
+            # background job revalidates. Expired: validated synchronously.
+            # The result is kept on request.parent_ctx for permission checks.
+            get_parent_ctx(request).lease_ok
         return self.get_response(request)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_alter_user_managers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="last_unmatched_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="unmatched_attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
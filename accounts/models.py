@@ -35,6 +35,10 @@ class User(AbstractUser):
     is_parent = models.BooleanField(default=True)
     external_parent_id = models.CharField(max_length=64, blank=True, null=True)
     last_validated_at = models.DateTimeField(blank=True, null=True)
+    # Negative lease: last validation that found no students, and how many
+    # consecutive ones did (drives the retry backoff in accounts.lease)
+    last_unmatched_at = models.DateTimeField(blank=True, null=True)
+    unmatched_attempts = models.PositiveSmallIntegerField(default=0)
     EMAIL_FIELD = "email"
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
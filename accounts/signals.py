@@ -8,8 +8,10 @@ from allauth.account.signals import (
 )
 from django.db.models.signals import post_save, post_migrate
 from django.conf import settings
+from django.contrib import messages
 from allauth.account.models import EmailAddress
-from crm.service import validate_parent
+from students import link_cache
+from .lease import schedule_email_revalidation
 from .models import EmailPreference, User
 from urllib.parse import urlparse
 from django.contrib.sites.models import Site
@@ -52,24 +54,36 @@ def sync_site_domain(sender, **kwargs):
         pass
 
 
+def _refresh_links_later(request, user):
+    # Links are recomputed by a debounced RQ job, not in this request
+    link_cache.invalidate(user.pk)
+    schedule_email_revalidation(user)
+    if request is not None:
+        messages.info(
+            request,
+            "Your linked students are being refreshed and will update shortly.",
+            fail_silently=True,
+        )
+
+
 @receiver(email_confirmed)
 def on_email_confirmed(sender, request, email_address, **kwargs):
     # Refresh links when an address becomes verified
     user = getattr(email_address, "user", None)
     if user:
-        validate_parent(user)
+        _refresh_links_later(request, user)
 
 
 @receiver(email_added)
 def on_email_added(sender, request, user, email_address, **kwargs):
     # Adding an alternate may create new Fabric matches
-    validate_parent(user)
+    _refresh_links_later(request, user)
 
 
 @receiver(email_removed)
 def on_email_removed(sender, request, user, email_address, **kwargs):
     # Removal may drop matches; re-evaluate links
-    validate_parent(user)
+    _refresh_links_later(request, user)
 
 
 @receiver(email_changed)
@@ -77,4 +91,4 @@ def on_email_changed(
     sender, request, user, from_email_address, to_email_address, **kwargs
 ):
     # Primary change or update — re-evaluate links
-    validate_parent(user)
+    _refresh_links_later(request, user)
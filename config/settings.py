@@ -125,6 +125,8 @@ AUTH_PASSWORD_VALIDATORS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # total time budget for Fabric/Dynamics calls made by this request
+    "crm.resilience.RequestBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -133,7 +135,8 @@ MIDDLEWARE = [
     "allauth.account.middleware.AccountMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
-    # identity lease validation
+    # request.parent_ctx, then identity lease validation
+    "students.context.ParentContextMiddleware",
     "accounts.middleware.IdentityLeaseMiddleware",
 ]
 
@@ -200,12 +203,87 @@ if FABRIC_DB and FABRIC_HOST:
         },
     }
 
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "vossie-cache",
+# Per-process pool of long-lived Fabric ODBC connections (students.fabric).
+# Size it to roughly the number of threads per worker (gunicorn --threads).
+FABRIC_POOL_SIZE = int(os.environ.get("FABRIC_POOL_SIZE", "4"))
+FABRIC_POOL_TIMEOUT_SECONDS = float(
+    os.environ.get("FABRIC_POOL_TIMEOUT_SECONDS", "10")
+)
+FABRIC_POOL_MAX_LIFETIME_SECONDS = int(
+    os.environ.get("FABRIC_POOL_MAX_LIFETIME_SECONDS", "3000")
+)
+FABRIC_POOL_PING_AFTER_SECONDS = int(
+    os.environ.get("FABRIC_POOL_PING_AFTER_SECONDS", "60")
+)
+FABRIC_POOL_STATS_LOG_SECONDS = int(
+    os.environ.get("FABRIC_POOL_STATS_LOG_SECONDS", "300")
+)
+# Rows per page on the at-risk listing (keyset-paged in Fabric)
+ATRISK_PAGE_SIZE = int(os.environ.get("ATRISK_PAGE_SIZE", "50"))
+# Primary id column of the at-risk table; the listing's unique keyset tiebreaker
+FABRIC_ATRISK_ID_COLUMN = os.environ.get("FABRIC_ATRISK_ID_COLUMN", "edv_atriskid")
+# sync_contacts: incremental by watermark column, full reconcile periodically
+FABRIC_CONTACT_WATERMARK_COLUMN = os.environ.get(
+    "FABRIC_CONTACT_WATERMARK_COLUMN", "modifiedon"
+)
+FABRIC_CONTACT_WATERMARK_LOOKBACK_SECONDS = int(
+    os.environ.get("FABRIC_CONTACT_WATERMARK_LOOKBACK_SECONDS", "300")
+)
+FABRIC_CONTACT_FULL_SYNC_HOURS = float(
+    os.environ.get("FABRIC_CONTACT_FULL_SYNC_HOURS", "24")
+)
+FABRIC_CONTACT_MAX_DELETE_FRACTION = float(
+    os.environ.get("FABRIC_CONTACT_MAX_DELETE_FRACTION", "0.2")
+)
+# Columns copied into Contact.raw_data: "" / "*" = all, "hot" = fields the
+# portal reads, or a comma-separated allow-list
+FABRIC_CONTACT_SYNC_COLUMNS = os.environ.get("FABRIC_CONTACT_SYNC_COLUMNS", "")
+FABRIC_CONTACT_SYNC_WORKERS = int(
+    os.environ.get("FABRIC_CONTACT_SYNC_WORKERS", "1")
+)
+CONTACT_SYNC_CRON = os.environ.get("CONTACT_SYNC_CRON", "*/5 * * * *")
+# RQ job timeout for a contact sync run; a run still going when the next one
+# is due makes that one a no-op
+CONTACT_SYNC_JOB_TIMEOUT_SECONDS = int(
+    os.environ.get("CONTACT_SYNC_JOB_TIMEOUT_SECONDS", "3600")
+)
+# Nightly bulk recompute of parent links from the Contact mirror
+PARENT_LINK_REFRESH_CRON = os.environ.get("PARENT_LINK_REFRESH_CRON", "30 2 * * *")
+
+# INFORMATION_SCHEMA column lists; warm with `manage.py warm_fabric_schema`
+FABRIC_SCHEMA_CACHE_TTL_SECONDS = int(
+    os.environ.get("FABRIC_SCHEMA_CACHE_TTL_SECONDS", "86400")
+)
+
+# Set CACHE_REDIS_URL (e.g. redis://localhost:6379/1) to share the cache -
+# tokens, locks and metrics - across all gunicorn workers and RQ jobs.
+CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "")
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
     }
-}
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "vossie-cache",
+        }
+    }
+
+# MSAL access tokens (Dynamics + Fabric) are refreshed this long before expiry
+MSAL_TOKEN_CACHE_ALIAS = os.environ.get("MSAL_TOKEN_CACHE_ALIAS", "default")
+MSAL_TOKEN_REFRESH_MARGIN_SECONDS = int(
+    os.environ.get("MSAL_TOKEN_REFRESH_MARGIN_SECONDS", "300")
+)
+
+# Per-minute operational counters (crm.metrics)
+METRICS_CACHE_ALIAS = os.environ.get("METRICS_CACHE_ALIAS", "default")
+METRICS_RETENTION_SECONDS = int(
+    os.environ.get("METRICS_RETENTION_SECONDS", "3600")
+)
 
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "UTC"
@@ -288,10 +366,118 @@ DYNAMICS_SPONSOR1_EMAIL_FIELD = os.environ.get(
     "DYN_SPONSOR1_EMAIL_FIELD", "btfh_sponsor1email"
 )
 
+# External call resilience (crm.resilience). Breaker state is shared through
+# the default cache, so use Redis in production.
+# Dataverse HTTP: read timeout, connect timeout and keep-alive pool size
+# (connections kept per process; see `manage.py bench_dynamics`)
+DYNAMICS_HTTP_TIMEOUT_SECONDS = float(
+    os.environ.get("DYNAMICS_HTTP_TIMEOUT_SECONDS", "20")
+)
+DYNAMICS_HTTP_CONNECT_TIMEOUT_SECONDS = float(
+    os.environ.get("DYNAMICS_HTTP_CONNECT_TIMEOUT_SECONDS", "5")
+)
+DYNAMICS_HTTP_POOL_SIZE = int(os.environ.get("DYNAMICS_HTTP_POOL_SIZE", "10"))
+# Worker threads per process for concurrent FetchXML (crm.service.fetchxml_many)
+DYNAMICS_FETCH_CONCURRENCY = int(os.environ.get("DYNAMICS_FETCH_CONCURRENCY", "4"))
+# Fabric connect and per-statement timeouts
+FABRIC_CONNECT_TIMEOUT_SECONDS = int(
+    os.environ.get("FABRIC_CONNECT_TIMEOUT_SECONDS", "30")
+)
+FABRIC_QUERY_TIMEOUT_SECONDS = int(
+    os.environ.get("FABRIC_QUERY_TIMEOUT_SECONDS", "30")
+)
+# Breakers open after THRESHOLD failures within WINDOW, for OPEN seconds
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_FAILURE_WINDOW_SECONDS = int(
+    os.environ.get("CIRCUIT_FAILURE_WINDOW_SECONDS", "60")
+)
+CIRCUIT_OPEN_SECONDS = int(os.environ.get("CIRCUIT_OPEN_SECONDS", "30"))
+# Per-request budget for all external calls together (0 disables)
+REQUEST_TIME_BUDGET_SECONDS = float(
+    os.environ.get("REQUEST_TIME_BUDGET_SECONDS", "15")
+)
+REQUEST_TIME_BUDGET_MIN_CALL_SECONDS = float(
+    os.environ.get("REQUEST_TIME_BUDGET_MIN_CALL_SECONDS", "0.5")
+)
+
+# Transcripts
+# Shared transcript cache (academics.transcript_cache): per student, zlib
+# compressed, skipped when larger than the byte limit
+TRANSCRIPT_CACHE_TTL_SECONDS = int(
+    os.environ.get("TRANSCRIPT_CACHE_TTL_SECONDS", "900")
+)
+TRANSCRIPT_CACHE_MAX_BYTES = int(
+    os.environ.get("TRANSCRIPT_CACHE_MAX_BYTES", "262144")
+)
+# Local transcript store (academics.transcript_store), refreshed by RQ
+TRANSCRIPT_SYNC_CRON = os.environ.get("TRANSCRIPT_SYNC_CRON", "*/15 * * * *")
+# RQ job timeout for a transcript sync run (a full pass can take a while);
+# overlapping runs are skipped
+TRANSCRIPT_SYNC_JOB_TIMEOUT_SECONDS = int(
+    os.environ.get("TRANSCRIPT_SYNC_JOB_TIMEOUT_SECONDS", "3600")
+)
+# Student programs (academics.programs) sync as a separate job; the full
+# pass interval, lookback and max delete fraction below apply to both
+PROGRAM_SYNC_CRON = os.environ.get("PROGRAM_SYNC_CRON", "5,20,35,50 * * * *")
+PROGRAM_SYNC_JOB_TIMEOUT_SECONDS = int(
+    os.environ.get("PROGRAM_SYNC_JOB_TIMEOUT_SECONDS", "1800")
+)
+TRANSCRIPT_STORE_FULL_SYNC_HOURS = int(
+    os.environ.get("TRANSCRIPT_STORE_FULL_SYNC_HOURS", "24")
+)
+TRANSCRIPT_STORE_LOOKBACK_SECONDS = int(
+    os.environ.get("TRANSCRIPT_STORE_LOOKBACK_SECONDS", "300")
+)
+# A full pass that would delete more than this share of stored rows is
+# treated as a truncated read: nothing is deleted and the pass is retried
+TRANSCRIPT_STORE_MAX_DELETE_FRACTION = float(
+    os.environ.get("TRANSCRIPT_STORE_MAX_DELETE_FRACTION", "0.2")
+)
+
 # Identity lease
 IDENTITY_LEASE_TTL_SECONDS = int(
     os.environ.get("IDENTITY_LEASE_TTL_SECONDS", "3600")
 )
+# Between the soft TTL above and this hard TTL, requests use existing links
+# while an RQ job revalidates; past it validation blocks the request.
+IDENTITY_LEASE_HARD_TTL_SECONDS = int(
+    os.environ.get("IDENTITY_LEASE_HARD_TTL_SECONDS", "14400")
+)
+IDENTITY_LEASE_REVALIDATE_DEBOUNCE_SECONDS = int(
+    os.environ.get("IDENTITY_LEASE_REVALIDATE_DEBOUNCE_SECONDS", "300")
+)
+# Email add/remove/confirm/change events within this window collapse into one
+# background revalidation
+EMAIL_REVALIDATE_DELAY_SECONDS = int(
+    os.environ.get("EMAIL_REVALIDATE_DELAY_SECONDS", "15")
+)
+# Negative lease for parents with no matched students: retry after the base
+# TTL, doubling per consecutive miss up to the max (seconds)
+IDENTITY_NEGATIVE_LEASE_BASE_SECONDS = int(
+    os.environ.get("IDENTITY_NEGATIVE_LEASE_BASE_SECONDS", "300")
+)
+IDENTITY_NEGATIVE_LEASE_MAX_SECONDS = int(
+    os.environ.get("IDENTITY_NEGATIVE_LEASE_MAX_SECONDS", "21600")
+)
+# Single-flight guard: concurrent validate_parent calls for one user wait for
+# the in-flight run (lock expiry / max wait, seconds)
+VALIDATE_PARENT_LOCK_SECONDS = int(
+    os.environ.get("VALIDATE_PARENT_LOCK_SECONDS", "60")
+)
+VALIDATE_PARENT_WAIT_SECONDS = float(
+    os.environ.get("VALIDATE_PARENT_WAIT_SECONDS", "25")
+)
+# When Fabric/Dynamics can't be asked (or the wait above times out), existing
+# links are used only this long after the last successful validation
+VALIDATE_PARENT_OUTAGE_GRACE_SECONDS = int(
+    os.environ.get("VALIDATE_PARENT_OUTAGE_GRACE_SECONDS", "86400")
+)
+# Shared per-user set of viewable student ids (students.link_cache); versioned
+# so invalidation is immediate. Only used with CACHE_REDIS_URL; otherwise every
+# permission check reads the database
+LINKED_STUDENTS_CACHE_TTL_SECONDS = int(
+    os.environ.get("LINKED_STUDENTS_CACHE_TTL_SECONDS", "300")
+)
 
 # Site URL for building absolute links
 SITE_URL = os.environ.get("SITE_URL", "http://localhost:8000")
@@ -4,7 +4,7 @@ from django.shortcuts import render, get_object_or_404
 from django.db.models import Exists, OuterRef
 from .models import Announcement, ReadReceipt
 from .services import get_notice_buckets_for_user
-from students.models import ParentStudentLink
+from students.link_cache import get_linked_student_ids
 from academics.models import Enrollment
 
 from django.views.decorators.http import require_GET
@@ -16,14 +16,11 @@ def _user_can_view_announcement(user, ann: Announcement) -> bool:
     if ann.audience == "PARENT":
         return ann.to_user_id == user.id or ann.to_user_id is None
     if ann.audience == "STUDENT":
-        return ParentStudentLink.objects.filter(
-            user=user, student_id=ann.student_id, active=True
-        ).exists()
+        return ann.student_id in get_linked_student_ids(user.pk)
     if ann.audience == "MODULE":
-        return Enrollment.objects.filter(
-            student__in=ParentStudentLink.objects.filter(
-                user=user, active=True
-            ).values_list("student_id", flat=True),
+        student_ids = get_linked_student_ids(user.pk)
+        return bool(student_ids) and Enrollment.objects.filter(
+            student_id__in=student_ids,
             module_id=ann.module_id,
         ).exists()
     return False
@@ -0,0 +1,318 @@
+"""Row decoding and bulk upsert used by the sync_contacts command."""
+import datetime
+import decimal
+import hashlib
+import json
+import logging
+import time
+from django.db import transaction
+from django.utils import timezone
+from . import email_index
+from .models import Contact
+
+logger = logging.getLogger(__name__)
+
+# Columns rewritten when an existing contact_id is upserted
+UPDATE_FIELDS = [
+    "first_name",
+    "last_name",
+    "email",
+    "sponsor1_email",
+    "sponsor2_email",
+    "raw_data",
+    "row_hash",
+    "source_table",
+    "updated_at",
+]
+
+
+# Fields the portal reads from Contact.raw_data; the "hot" projection keeps
+# only these (plus sponsor, email and watermark columns).
+HOT_FIELDS = (
+    "contactid",
+    "firstname",
+    "lastname",
+    "fullname",
+    "emailaddress1",
+    "msdyn_contactpersonid",
+    "msdyn_identificationnumber",
+    "btfo_financeblock",
+    "bt_collectionbalance",
+)
+
+# Convert Decimals and datetimes to strings for JSONField storage
+_JSON_CONVERTERS = {
+    decimal.Decimal: str,
+    datetime.date: datetime.date.isoformat,
+    datetime.datetime: datetime.datetime.isoformat,
+}
+
+
+def row_hash(raw_data: dict) -> str:
+    """Stable content hash of a cleaned source row (key order independent)."""
+    payload = json.dumps(raw_data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def projected_columns(schema: str, table: str, watermark_column: str):
+    """Source columns to select, or ``None`` for ``SELECT *``.
+
+    FABRIC_CONTACT_SYNC_COLUMNS is empty/``*`` (all columns), ``hot``
+    (HOT_FIELDS) or a comma-separated allow-list. contactid, the indexed
+    email columns and the watermark column are always included. Names are
+    matched case-insensitively against the cached table columns.
+    """
+    from django.conf import settings
+    from students.fabric import get_table_columns
+
+    raw = str(getattr(settings, "FABRIC_CONTACT_SYNC_COLUMNS", "") or "").strip()
+    if not raw or raw == "*":
+        return None
+    if raw.lower() == "hot":
+        wanted = list(HOT_FIELDS)
+    else:
+        wanted = [c.strip().lower() for c in raw.split(",") if c.strip()]
+    wanted += email_index.indexed_fields() + ["contactid", watermark_column.lower()]
+    lower_map = {c.lower(): c for c in get_table_columns(schema, table)}
+    if "contactid" not in lower_map:
+        return None
+    cols = []
+    for w in wanted:
+        if w in lower_map and lower_map[w] not in cols:
+            cols.append(lower_map[w])
+    return cols
+
+
+class RowDecoder:
+    """Turns rows of one result set into ``(Contact, index_data)`` pairs.
+
+    Column positions are resolved once from ``cursor.description``; each row
+    then costs one raw_data dict plus a small dict of the indexed email
+    columns.
+    """
+
+    def __init__(
+        self, description, watermark_column: str = "modifiedon", source_table: str = ""
+    ):
+        self.source_table = source_table
+        self.columns = [c[0] for c in description]
+        lower = [c.lower() for c in self.columns]
+        pos = {c: i for i, c in enumerate(lower)}
+        self.id_pos = pos.get("contactid")
+        self.watermark_pos = pos.get(watermark_column.lower())
+        self.field_pos = {
+            attr: pos.get(col)
+            for attr, col in (
+                ("first_name", "firstname"),
+                ("last_name", "lastname"),
+                ("email", "emailaddress1"),
+                ("sponsor1_email", "btfh_sponsor1email"),
+                ("sponsor2_email", "btfh_sponsor2email"),
+            )
+        }
+        self.index_pos = [
+            (f, pos[f]) for f in email_index.indexed_fields() if f in pos
+        ]
+
+    def watermark(self, row):
+        if self.watermark_pos is None:
+            return None
+        return row[self.watermark_pos]
+
+    def decode(self, row):
+        """Return ``(contact, index_data)``; contact is ``None`` without an id."""
+        contact_id = row[self.id_pos] if self.id_pos is not None else None
+        if not contact_id:
+            return None, None
+        raw_data = {}
+        for name, v in zip(self.columns, row):
+            conv = _JSON_CONVERTERS.get(type(v))
+            raw_data[name] = conv(v) if conv else v
+        contact = Contact(
+            contact_id=contact_id,
+            raw_data=raw_data,
+            row_hash=row_hash(raw_data),
+            source_table=self.source_table,
+            **{
+                attr: (row[i] if i is not None else None)
+                for attr, i in self.field_pos.items()
+            },
+        )
+        index_data = {f: row[i] for f, i in self.index_pos}
+        return contact, index_data
+
+
+def upsert_batch(items: list[tuple]) -> dict:
+    """Insert or update ``[(contact, index_data), ...]`` in one transaction.
+
+    Rows whose ``row_hash`` matches the stored one are skipped entirely, so
+    unchanged contacts keep their ``updated_at`` and index rows. The rest are
+    written with a single INSERT ... ON CONFLICT (contact_id) DO UPDATE and
+    their email index rows rewritten. The hash read (with row locks), the
+    writes and the index rewrite share the transaction. Returns
+    inserted/updated/unchanged counts.
+    """
+    by_id = {}
+    for contact, data in items:
+        # ON CONFLICT cannot touch the same row twice in one statement
+        by_id[contact.contact_id] = (contact, data)
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if not by_id:
+        return counts
+    with transaction.atomic():
+        # Lock the existing rows so a concurrent sync can't change them
+        # between the hash comparison and the write
+        existing = {
+            cid: (h, table)
+            for cid, h, table in Contact.objects.select_for_update().filter(
+                contact_id__in=list(by_id)
+            ).values_list("contact_id", "row_hash", "source_table")
+        }
+        now = timezone.now()
+        contacts = []
+        restamp = {}
+        for cid, (contact, _) in list(by_id.items()):
+            if cid not in existing:
+                counts["inserted"] += 1
+            elif existing[cid][0] == contact.row_hash:
+                counts["unchanged"] += 1
+                if existing[cid][1] != contact.source_table:
+                    restamp.setdefault(contact.source_table, []).append(cid)
+                del by_id[cid]
+                continue
+            else:
+                counts["updated"] += 1
+            contact.updated_at = now
+            contacts.append(contact)
+        # Unchanged rows only need their table recorded (e.g. rows synced
+        # before source_table existed)
+        for table, ids in restamp.items():
+            Contact.objects.filter(contact_id__in=ids).update(source_table=table)
+        if not contacts:
+            return counts
+        Contact.objects.bulk_create(
+            contacts,
+            update_conflicts=True,
+            unique_fields=["contact_id"],
+            update_fields=UPDATE_FIELDS,
+        )
+        pks = dict(
+            Contact.objects.filter(contact_id__in=list(by_id)).values_list(
+                "contact_id", "id"
+            )
+        )
+        email_index.replace_entries(
+            {pks[cid]: data for cid, (_, data) in by_id.items() if cid in pks}
+        )
+    return counts
+
+
+def partition_predicate(partitions: int, partition: int) -> str:
+    """T-SQL filter selecting one hash partition of contactid."""
+    return (
+        f"ABS(CHECKSUM([contactid])) % {int(partitions)} = {int(partition)}"
+    )
+
+
+def sync_partition(
+    schema: str,
+    table: str,
+    since=None,
+    partition: int = 0,
+    partitions: int = 1,
+    watermark_column: str = "modifiedon",
+    batch_size: int = 1000,
+    collect_ids: bool = False,
+    progress=None,
+) -> dict:
+    """Stream one (table, partition) from Fabric into the Contact mirror.
+
+    Opens its own Fabric connection so it can run inside a worker process.
+    ``since`` limits the read to rows changed at or after that time.
+    ``progress`` is called with the running row count after each batch.
+    Returns counters, elapsed seconds, the highest watermark seen and,
+    with ``collect_ids``, the set of contact ids read.
+    """
+    from students.fabric import _pyodbc_conn
+
+    result = {
+        "table": f"{schema}.{table}",
+        "partition": partition,
+        "rows": 0,
+        "inserted": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "seconds": 0.0,
+        "high_water": None,
+        "ids": set() if collect_ids else None,
+        "error": None,
+    }
+    started = time.monotonic()
+    conn = _pyodbc_conn()
+    if not conn:
+        result["error"] = "Could not connect to Fabric DB."
+        return result
+    try:
+        where = []
+        params = []
+        if since is not None:
+            where.append(f"[{watermark_column}] >= ?")
+            params.append(since)
+        if partitions > 1:
+            where.append(partition_predicate(partitions, partition))
+        cols = projected_columns(schema, table, watermark_column)
+        select = ", ".join(f"[{c}]" for c in cols) if cols else "*"
+        sql = f"SELECT {select} FROM [{schema}].[{table}]"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        decoder = RowDecoder(
+            cursor.description, watermark_column, source_table=result["table"]
+        )
+        high_water = None
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            items = []
+            for row in rows:
+                contact, index_data = decoder.decode(row)
+                if contact is None:
+                    continue
+                changed = decoder.watermark(row)
+                if isinstance(changed, datetime.datetime) and (
+                    high_water is None or changed > high_water
+                ):
+                    high_water = changed
+                if collect_ids:
+                    result["ids"].add(contact.contact_id)
+                items.append((contact, index_data))
+            for k, v in upsert_batch(items).items():
+                result[k] += v
+            result["rows"] += len(items)
+            if progress:
+                progress(result["rows"])
+        result["high_water"] = high_water
+    except Exception as e:
+        logger.exception(
+            "Contact sync failed for %s.%s partition %d", schema, table, partition
+        )
+        result["error"] = str(e)
+    finally:
+        try:
+            conn.close()
+        except Exception:
+            pass
+    result["seconds"] = time.monotonic() - started
+    return result
+
+
+def run_partition_in_worker(kwargs: dict) -> dict:
+    """ProcessPoolExecutor entry point; releases this process's DB connections."""
+    from django.db import connections
+
+    try:
+        return sync_partition(**kwargs)
+    finally:
+        connections.close_all()
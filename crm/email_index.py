@@ -0,0 +1,105 @@
+"""Maintenance and lookups for the ContactEmail reverse index."""
+from django.conf import settings
+from .models import Contact, ContactEmail
+
+# Column always indexed alongside the sponsor columns (student's own email).
+CONTACT_EMAIL_FIELD = "emailaddress1"
+
+
+def normalize_email(value) -> str:
+    return str(value or "").strip().lower()
+
+
+def sponsor_email_fields() -> list[str]:
+    raw = getattr(
+        settings,
+        "FABRIC_SPONSOR_EMAIL_FIELDS",
+        "btfh_sponsor1email,btfh_sponsor2email",
+    )
+    return [c.strip().lower() for c in raw.split(",") if c.strip()]
+
+
+def indexed_fields() -> list[str]:
+    fields = sponsor_email_fields()
+    if CONTACT_EMAIL_FIELD not in fields:
+        fields.append(CONTACT_EMAIL_FIELD)
+    return fields
+
+
+def entries_for(contact_pk: int, data: dict) -> list[ContactEmail]:
+    """Index rows for one contact; ``data`` must have lowercased keys."""
+    out = []
+    seen = set()
+    for field in indexed_fields():
+        e = normalize_email(data.get(field))
+        if not e or "@" not in e or (e, field) in seen:
+            continue
+        seen.add((e, field))
+        out.append(ContactEmail(email=e, contact_id=contact_pk, source=field))
+    return out
+
+
+def replace_entries(contact_data: dict[int, dict]):
+    """Rewrite the index rows for ``{contact_pk: lowercased_row}``."""
+    if not contact_data:
+        return
+    ContactEmail.objects.filter(contact_id__in=list(contact_data)).delete()
+    rows = []
+    for pk, data in contact_data.items():
+        rows.extend(entries_for(pk, data))
+    ContactEmail.objects.bulk_create(rows, batch_size=1000)
+
+
+def contact_index_data(contact: Contact) -> dict:
+    """Lowercased source row for an already-mirrored contact."""
+    data = {k.lower(): v for k, v in (contact.raw_data or {}).items()}
+    data.setdefault(CONTACT_EMAIL_FIELD, contact.email)
+    data.setdefault("btfh_sponsor1email", contact.sponsor1_email)
+    data.setdefault("btfh_sponsor2email", contact.sponsor2_email)
+    return data
+
+
+def rebuild(batch_size: int = 1000) -> int:
+    """Rebuild the whole index from the local Contact mirror."""
+    count = 0
+    batch = {}
+    for c in Contact.objects.only(
+        "id", "email", "sponsor1_email", "sponsor2_email", "raw_data"
+    ).iterator(chunk_size=batch_size):
+        batch[c.id] = contact_index_data(c)
+        if len(batch) >= batch_size:
+            replace_entries(batch)
+            count += len(batch)
+            batch = {}
+    replace_entries(batch)
+    return count + len(batch)
+
+
+def contacts_by_email(emails, sources=None) -> dict[str, list[Contact]]:
+    """Return ``{normalized_email: [Contact, ...]}`` for matching emails.
+
+    ``sources`` optionally restricts the match to specific source columns.
+    """
+    wanted = {normalize_email(e) for e in emails if normalize_email(e)}
+    if not wanted:
+        return {}
+    qs = ContactEmail.objects.filter(email__in=wanted).select_related("contact")
+    if sources:
+        qs = qs.filter(source__in=[s.lower() for s in sources])
+    out = {}
+    seen = set()
+    for ce in qs.order_by("email", "contact_id"):
+        if (ce.email, ce.contact_id) in seen:
+            continue
+        seen.add((ce.email, ce.contact_id))
+        out.setdefault(ce.email, []).append(ce.contact)
+    return out
+
+
+def sponsor_contacts_by_email(emails) -> dict[str, list[Contact]]:
+    """Students whose sponsor columns hold one of ``emails``.
+
+    The parent-matching rule shared by login validation and the nightly
+    link refresh; a student's own emailaddress1 never links a parent.
+    """
+    return contacts_by_email(emails, sources=sponsor_email_fields())
@@ -0,0 +1,63 @@
+import statistics
+import time
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from crm.msal_client import _build_http_session, _headers
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-call latency of one-off requests (new TCP+TLS "
+        "handshake each time) with the pooled keep-alive Dataverse session."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--calls", type=int, default=20, help="Calls per mode (default: 20)"
+        )
+        parser.add_argument(
+            "--path",
+            default="WhoAmI",
+            help="Web API path under /api/data/v9.2/ (default: WhoAmI)",
+        )
+        parser.add_argument(
+            "--url",
+            help="Benchmark this URL without auth instead of the Dynamics org",
+        )
+
+    def handle(self, *args, **opts):
+        if opts.get("url"):
+            url, headers = opts["url"], {}
+        else:
+            if not settings.DYNAMICS_ORG_URL:
+                raise CommandError("DYNAMICS_ORG_URL is not configured; pass --url")
+            url = f"{settings.DYNAMICS_ORG_URL}/api/data/v9.2/{opts['path'].lstrip('/')}"
+            headers = _headers()
+        calls = max(1, opts["calls"])
+        timeout = float(getattr(settings, "DYNAMICS_HTTP_TIMEOUT_SECONDS", 20))
+
+        session = _build_http_session()
+        # Warm the pooled connection so the handshake is not counted
+        session.get(url, headers=headers, timeout=timeout)
+        modes = {
+            "one-off": lambda: requests.get(url, headers=headers, timeout=timeout),
+            "pooled": lambda: session.get(url, headers=headers, timeout=timeout),
+        }
+        results = {}
+        for mode, call in modes.items():
+            samples = []
+            for _ in range(calls):
+                started = time.perf_counter()
+                call().raise_for_status()
+                samples.append((time.perf_counter() - started) * 1000)
+            samples.sort()
+            results[mode] = samples
+            self.stdout.write(
+                f"{mode:>8}: min={samples[0]:.1f}ms "
+                f"p50={statistics.median(samples):.1f}ms "
+                f"p95={samples[int(0.95 * (len(samples) - 1))]:.1f}ms "
+                f"mean={statistics.fmean(samples):.1f}ms"
+            )
+        saved = statistics.median(results["one-off"]) - statistics.median(results["pooled"])
+        self.stdout.write(self.style.SUCCESS(f"Median saving per call: {saved:.1f}ms"))
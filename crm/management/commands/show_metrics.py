@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from crm import metrics
+
+
+class Command(BaseCommand):
+    help = "Show per-minute operational counters from the shared cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "names",
+            nargs="*",
+            help="Metric names (default: all known metrics)",
+        )
+        parser.add_argument(
+            "--minutes", type=int, default=5, help="Minutes to show (default: 5)"
+        )
+
+    def handle(self, *args, **options):
+        names = options["names"] or list(metrics.KNOWN_METRICS)
+        for name in names:
+            series = metrics.per_minute(name, options["minutes"])
+            counts = " ".join(str(c) for _, c in series)
+            self.stdout.write(
+                f"{name}: last_minute={series[0][1]} "
+                f"per_minute(newest first)=[{counts}]"
+            )
@@ -1,92 +1,252 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from django.core.management.base import BaseCommand
-from crm.models import Contact
-from students.fabric import _pyodbc_conn, _row_to_dict, _candidate_tables
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from crm.models import Contact, SyncState
+from crm import email_index
+from crm.contact_sync import run_partition_in_worker, sync_partition
+from students.fabric import _candidate_tables
+import datetime
 import logging
+import multiprocessing
+import time
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = "Syncs contacts from Fabric/Dynamics to local Contact table."
+    help = (
+        "Syncs contacts from Fabric/Dynamics to local Contact table. "
+        "Runs incrementally from the stored watermark unless a full "
+        "reconcile (which also removes deleted contacts) is due or forced."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild-email-index",
+            action="store_true",
+            help="Only rebuild the ContactEmail index from the local mirror",
+        )
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Force a full sync and delete contacts missing from the source",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=getattr(settings, "FABRIC_CONTACT_SYNC_WORKERS", 1),
+            help=(
+                "Worker processes; each table is split into this many "
+                "contactid hash partitions (default: 1, in-process)"
+            ),
+        )
+        parser.add_argument(
+            "--all-tables",
+            action="store_true",
+            help="Sync every FABRIC_CONTACT_TABLES entry, not just the first",
+        )
 
     def handle(self, *args, **options):
+        if options.get("rebuild_email_index"):
+            count = email_index.rebuild()
+            self.stdout.write(
+                self.style.SUCCESS(f"Rebuilt email index for {count} contacts.")
+            )
+            return
+
         self.stdout.write("Starting contact sync...")
-        
-        conn = _pyodbc_conn()
-        if not conn:
-            self.stdout.write(self.style.ERROR("Could not connect to Fabric DB."))
+
+        tables = _candidate_tables()
+        if not tables:
+            self.stdout.write(self.style.ERROR("No candidate tables configured."))
             return
+        if not options.get("all_tables"):
+            # Primary table is usually the first one
+            tables = tables[:1]
+
+        wm_col = getattr(settings, "FABRIC_CONTACT_WATERMARK_COLUMN", "modifiedon")
+        workers = max(1, int(options.get("workers") or 1))
+        full = bool(options.get("full"))
+
+        plans = []
+        tasks = []
+        for schema, table in tables:
+            state, _ = SyncState.objects.get_or_create(
+                key=f"contacts:{schema}.{table}"
+            )
+            since = None
+            if not (full or self._full_sync_due(state)):
+                since = self._since(state)
+            plans.append({"table": f"{schema}.{table}", "state": state, "since": since})
+            if since is None:
+                self.stdout.write(f"Full sync from [{schema}].[{table}]...")
+            else:
+                self.stdout.write(
+                    f"Incremental sync from [{schema}].[{table}] "
+                    f"where {wm_col} >= {since.isoformat()}..."
+                )
+            for k in range(workers):
+                tasks.append({
+                    "schema": schema,
+                    "table": table,
+                    "since": since,
+                    "partition": k,
+                    "partitions": workers,
+                    "watermark_column": wm_col,
+                    "collect_ids": since is None,
+                })
+
+        started = time.monotonic()
+        results = []
+        if workers == 1 and len(tasks) == 1:
+            task = dict(tasks[0])
+            task["progress"] = lambda n: self.stdout.write(
+                f"Processed {n} records "
+                f"({n / max(time.monotonic() - started, 1e-6):,.0f} rows/s)...",
+                ending='\r',
+            )
+            results.append(sync_partition(**task))
+            self.stdout.write("")
+            if results[0]["error"]:
+                self.stdout.write(
+                    self.style.ERROR(f"Error during sync: {results[0]['error']}")
+                )
+        else:
+            # Children must open their own DB connections, never share ours
+            connections.close_all()
+            ctx = multiprocessing.get_context("fork")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+                futures = {pool.submit(run_partition_in_worker, t): t for t in tasks}
+                for fut in as_completed(futures):
+                    try:
+                        res = fut.result()
+                    except Exception as ex:
+                        # A crashed worker fails its partition, not the whole run
+                        task = futures[fut]
+                        res = {
+                            "table": f"{task['schema']}.{task['table']}",
+                            "partition": task["partition"],
+                            "rows": 0, "inserted": 0, "updated": 0, "unchanged": 0,
+                            "seconds": 0.0, "high_water": None, "ids": None,
+                            "error": f"{type(ex).__name__}: {ex}",
+                        }
+                    results.append(res)
+                    self._report_partition(res, len(results), len(tasks))
+
+        self._finish(plans, results, started)
 
+    def _report_partition(self, res, done, total):
+        line = (
+            f"[{done}/{total}] {res['table']} partition {res['partition']}: "
+            f"{res['rows']} rows in {res['seconds']:.1f}s "
+            f"(inserted={res['inserted']} updated={res['updated']} "
+            f"unchanged={res['unchanged']})"
+        )
+        if res["error"]:
+            self.stdout.write(self.style.ERROR(f"{line} error: {res['error']}"))
+        else:
+            self.stdout.write(line)
+
+    def _finish(self, plans, results, started):
+        totals = {"rows": 0, "inserted": 0, "updated": 0, "unchanged": 0}
+        for res in results:
+            for k in totals:
+                totals[k] += res[k]
+        failed = [r for r in results if r["error"]]
+
+        seen_ids = set()
+        full_tables = []
+        for plan in plans:
+            mine = [r for r in results if r["table"] == plan["table"]]
+            if any(r["error"] for r in mine):
+                continue
+            marks = [r["high_water"] for r in mine if r["high_water"]]
+            self._save_state(
+                plan["state"], max(marks) if marks else None,
+                full=plan["since"] is None,
+            )
+            if plan["since"] is None:
+                full_tables.append(plan["table"])
+                for r in mine:
+                    seen_ids |= r["ids"] or set()
+
+        deleted = 0
+        if full_tables and seen_ids:
+            deleted = self._delete_missing(seen_ids, full_tables)
+
+        elapsed = time.monotonic() - started
+        summary = (
+            f"Synced {totals['rows']} contacts in {elapsed:.1f}s "
+            f"({totals['rows'] / max(elapsed, 1e-6):,.0f} rows/s): "
+            f"inserted={totals['inserted']} updated={totals['updated']} "
+            f"unchanged={totals['unchanged']} deleted={deleted}."
+        )
+        if failed:
+            self.stdout.write(self.style.ERROR(
+                f"{summary} {len(failed)} partition(s) failed; "
+                "their watermarks were not advanced."
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def _delete_missing(self, seen_ids, tables) -> int:
+        """Delete contacts of the fully read ``tables`` that weren't seen.
+
+        Rows of other tables are left alone; rows synced before
+        source_table was recorded only once every configured table was read.
+        """
+        configured = {f"{s}.{t}" for s, t in _candidate_tables()}
+        owned = Contact.objects.filter(source_table__in=tables)
+        if configured <= set(tables):
+            owned = Contact.objects.filter(source_table__in=[*tables, ""])
+        local_ids = set(owned.values_list("contact_id", flat=True))
+        missing = sorted(local_ids - seen_ids)
+        max_frac = float(
+            getattr(settings, "FABRIC_CONTACT_MAX_DELETE_FRACTION", 0.2)
+        )
+        if local_ids and len(missing) / len(local_ids) > max_frac:
+            # A truncated or half-loaded source table must not wipe the mirror
+            self.stdout.write(self.style.WARNING(
+                f"Skipping deletion of {len(missing)}/{len(local_ids)} contacts "
+                f"(exceeds FABRIC_CONTACT_MAX_DELETE_FRACTION={max_frac})."
+            ))
+            return 0
+        for i in range(0, len(missing), 1000):
+            Contact.objects.filter(contact_id__in=missing[i:i + 1000]).delete()
+        return len(missing)
+
+    def _full_sync_due(self, state) -> bool:
+        if not state.watermark or not state.last_full_sync_at:
+            return True
+        hours = getattr(settings, "FABRIC_CONTACT_FULL_SYNC_HOURS", 24)
+        age = timezone.now() - state.last_full_sync_at
+        return age.total_seconds() >= float(hours) * 3600
+
+    def _since(self, state):
         try:
-            tables = _candidate_tables()
-            if not tables:
-                self.stdout.write(self.style.ERROR("No candidate tables configured."))
-                return
+            wm = datetime.datetime.fromisoformat(state.watermark)
+        except (TypeError, ValueError):
+            return None
+        # Re-read a small window so rows committed late with an older
+        # modifiedon are not skipped; upserts make the overlap harmless.
+        lookback = getattr(settings, "FABRIC_CONTACT_WATERMARK_LOOKBACK_SECONDS", 300)
+        return wm - datetime.timedelta(seconds=int(lookback))
 
-            # Primary table is usually the first one
-            schema, table = tables[0]
-            self.stdout.write(f"Syncing from [{schema}].[{table}]...")
-            
-            cursor = conn.cursor()
-            
-            # Select all columns
-            cursor.execute(f"SELECT * FROM [{schema}].[{table}]")
-            
-            batch_size = 1000
-            count = 0
-            
-            while True:
-                rows = cursor.fetchmany(batch_size)
-                if not rows:
-                    break
-                
-                for row in rows:
-                    row_dict = _row_to_dict(cursor, row)
-                    
-                    # Normalize keys to lowercase for field mapping
-                    normalized_data = {k.lower(): v for k, v in row_dict.items()}
-                    
-                    # Clean row_dict for JSON serialization
-                    # Convert Decimals and datetimes to strings
-                    import decimal
-                    import datetime
-                    
-                    clean_raw_data = {}
-                    for k, v in row_dict.items():
-                        if isinstance(v, decimal.Decimal):
-                            clean_raw_data[k] = str(v)
-                        elif isinstance(v, (datetime.date, datetime.datetime)):
-                            clean_raw_data[k] = v.isoformat()
-                        else:
-                            clean_raw_data[k] = v
-                    
-                    contact_id = normalized_data.get('contactid')
-                    if not contact_id:
-                        continue
-                        
-                    defaults = {
-                        'first_name': normalized_data.get('firstname'),
-                        'last_name': normalized_data.get('lastname'),
-                        'email': normalized_data.get('emailaddress1'),
-                        'sponsor1_email': normalized_data.get('btfh_sponsor1email'),
-                        'sponsor2_email': normalized_data.get('btfh_sponsor2email'),
-                        'raw_data': clean_raw_data
-                    }
-                    
-                    Contact.objects.update_or_create(
-                        contact_id=contact_id,
-                        defaults=defaults
-                    )
-                    count += 1
-                
-                self.stdout.write(f"Processed {count} records...", ending='\r')
-                
-            self.stdout.write(self.style.SUCCESS(f"\nSuccessfully synced {count} contacts."))
-            
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Error during sync: {e}"))
-            logger.exception("Fabric sync failed")
-        finally:
+    def _save_state(self, state, high_water, full: bool):
+        now = timezone.now()
+        state.last_run_at = now
+        fields = ["last_run_at"]
+        if high_water is not None:
+            current = None
             try:
-                conn.close()
-            except Exception:
+                current = datetime.datetime.fromisoformat(state.watermark or "")
+            except ValueError:
                 pass
+            if current is None or high_water > current:
+                state.watermark = high_water.isoformat()
+                fields.append("watermark")
+        if full:
+            state.last_full_sync_at = now
+            fields.append("last_full_sync_at")
+        state.save(update_fields=fields)
@@ -0,0 +1,62 @@
+"""Lightweight per-minute counters kept in the shared Django cache.
+
+Counters are bucketed by minute so every gunicorn worker and RQ job adds to
+the same series when the default cache is Redis (CACHE_REDIS_URL). With the
+local-memory cache the numbers are per-process only.
+"""
+import logging
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "metrics"
+
+# Names listed by `manage.py show_metrics` when none are given.
+KNOWN_METRICS = (
+    "msal_token_fetch",
+    "validate_parent_run",
+    "validate_parent_duplicate",
+    "validate_parent_degraded_allow",
+    "validate_parent_degraded_deny",
+    "circuit_open_fabric",
+    "circuit_open_dynamics",
+    "budget_exhausted",
+)
+
+
+def _cache():
+    return caches[getattr(settings, "METRICS_CACHE_ALIAS", "default")]
+
+
+def _bucket(ts=None) -> int:
+    return int((ts if ts is not None else time.time()) // 60)
+
+
+def incr(name: str, n: int = 1):
+    """Add ``n`` to the current minute's bucket for ``name``; never raises."""
+    key = f"{KEY_PREFIX}:{name}:{_bucket()}"
+    retention = int(getattr(settings, "METRICS_RETENTION_SECONDS", 3600))
+    try:
+        c = _cache()
+        c.add(key, 0, timeout=retention)
+        c.incr(key, n)
+    except Exception as ex:
+        logger.debug("Metric incr failed for %s: %s", name, str(ex))
+
+
+def per_minute(name: str, minutes: int = 5) -> list[tuple[int, int]]:
+    """Return ``[(minute_epoch_seconds, count), ...]`` newest first."""
+    now = _bucket()
+    buckets = [now - i for i in range(max(1, int(minutes)))]
+    keys = [f"{KEY_PREFIX}:{name}:{b}" for b in buckets]
+    try:
+        found = _cache().get_many(keys)
+    except Exception:
+        found = {}
+    return [(b * 60, int(found.get(k) or 0)) for b, k in zip(buckets, keys)]
+
+
+def total(name: str, minutes: int = 5) -> int:
+    return sum(c for _, c in per_minute(name, minutes))
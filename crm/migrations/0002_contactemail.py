@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_email_index(apps, schema_editor):
+    Contact = apps.get_model("crm", "Contact")
+    ContactEmail = apps.get_model("crm", "ContactEmail")
+    raw = getattr(
+        settings,
+        "FABRIC_SPONSOR_EMAIL_FIELDS",
+        "btfh_sponsor1email,btfh_sponsor2email",
+    )
+    fields = [c.strip().lower() for c in raw.split(",") if c.strip()]
+    if "emailaddress1" not in fields:
+        fields.append("emailaddress1")
+    rows = []
+    for c in Contact.objects.iterator(chunk_size=1000):
+        data = {k.lower(): v for k, v in (c.raw_data or {}).items()}
+        data.setdefault("emailaddress1", c.email)
+        data.setdefault("btfh_sponsor1email", c.sponsor1_email)
+        data.setdefault("btfh_sponsor2email", c.sponsor2_email)
+        seen = set()
+        for f in fields:
+            e = str(data.get(f) or "").strip().lower()
+            if e and "@" in e and (e, f) not in seen:
+                seen.add((e, f))
+                rows.append(ContactEmail(email=e, contact_id=c.id, source=f))
+        if len(rows) >= 1000:
+            ContactEmail.objects.bulk_create(rows)
+            rows = []
+    ContactEmail.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ContactEmail",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("email", models.CharField(max_length=254)),
+                ("source", models.CharField(max_length=64)),
+                (
+                    "contact",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="email_index",
+                        to="crm.contact",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("email", "contact", "source")},
+            },
+        ),
+        migrations.RunPython(build_email_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0002_contactemail"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SyncState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=128, unique=True)),
+                ("watermark", models.CharField(blank=True, max_length=64, null=True)),
+                ("last_run_at", models.DateTimeField(blank=True, null=True)),
+                ("last_full_sync_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0003_syncstate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contact",
+            name="row_hash",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
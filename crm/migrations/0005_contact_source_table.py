@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("crm", "0004_contact_row_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contact",
+            name="source_table",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=256
+            ),
+        ),
+    ]
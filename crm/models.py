@@ -10,9 +10,46 @@ class Contact(models.Model):
     
     # Store full row data from source table
     raw_data = models.JSONField(default=dict)
+    # sha256 of raw_data; sync skips rows whose hash is unchanged
+    row_hash = models.CharField(max_length=64, blank=True, null=True)
+    # "schema.table" the row was last read from; a full sync only deletes
+    # missing contacts of the tables it read
+    source_table = models.CharField(max_length=256, blank=True, default="", db_index=True)
     
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.contact_id})"
+
+
+class ContactEmail(models.Model):
+    """Reverse index: normalized (trimmed, lowercased) email -> contact.
+
+    One row per (email, contact, source column). Maintained by
+    sync_contacts so parent -> student resolution is a plain indexed
+    equality lookup instead of a case-insensitive scan.
+    """
+    email = models.CharField(max_length=254)
+    contact = models.ForeignKey(
+        Contact, on_delete=models.CASCADE, related_name="email_index"
+    )
+    source = models.CharField(max_length=64)
+
+    class Meta:
+        unique_together = [("email", "contact", "source")]
+
+    def __str__(self):
+        return f"{self.email} -> {self.contact_id} ({self.source})"
+
+
+class SyncState(models.Model):
+    """Persisted progress of an incremental sync (e.g. contacts:PP.contact)."""
+    key = models.CharField(max_length=128, unique=True)
+    # High-water mark of the source change column, stored as ISO-8601 text
+    watermark = models.CharField(max_length=64, blank=True, null=True)
+    last_run_at = models.DateTimeField(blank=True, null=True)
+    last_full_sync_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.key} @ {self.watermark or '-'}"
@@ -1,38 +1,73 @@
+import os
 import time
+import hashlib
 import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 import msal
 from django.conf import settings
-from django.core.cache import cache
+from django.core.cache import caches
+from . import metrics
+from .resilience import BudgetExceeded, CircuitBreaker, call_timeout
 
 
 TOKEN_CACHE_KEY = "dyn_app_token"
+FABRIC_SCOPE = "https://database.windows.net/.default"
 logger = logging.getLogger(__name__)
 
 class DynamicsAuthError(Exception):
     pass
 
 
-def get_app_token():
-    cached = cache.get(TOKEN_CACHE_KEY)
-    if cached and cached.get("expires_at", 0) > time.time() + 30:
-        return cached["access_token"]
-    if not settings.DYNAMICS_TENANT_ID or not settings.DYNAMICS_CLIENT_ID or not settings.DYNAMICS_CLIENT_SECRET:
-        # Configuration missing; surface a clear error for callers
-        logger.error("Dynamics credentials not fully configured (tenant/client/secret)")
-        raise DynamicsAuthError("Dynamics credentials are not configured")
-    if not settings.DYNAMICS_SCOPE:
-        logger.error("Dynamics scope is empty; ensure DYN_ORG_URL is set")
-        raise DynamicsAuthError("Dynamics scope is empty; set DYN_ORG_URL")
-    app = msal.ConfidentialClientApplication(
-        client_id=settings.DYNAMICS_CLIENT_ID,
-        client_credential=settings.DYNAMICS_CLIENT_SECRET,
-        authority=(
-            "https://login.microsoftonline.com/"
-            f"{settings.DYNAMICS_TENANT_ID}"
-        ),
-    )
-    result = app.acquire_token_for_client(scopes=[settings.DYNAMICS_SCOPE])
+# One MSAL app per (tenant, client) and one in-process copy of each token,
+# backed by the Django cache so every worker on the host shares the token
+# when the cache is Redis.
+_msal_apps = {}
+_local_tokens = {}
+_refresh_locks = {}
+_state_lock = threading.Lock()
+
+
+def _token_cache():
+    return caches[getattr(settings, "MSAL_TOKEN_CACHE_ALIAS", "default")]
+
+
+def _token_cache_key(client_id: str, scope: str) -> str:
+    digest = hashlib.sha1(f"{client_id}|{scope}".encode()).hexdigest()[:16]
+    return f"{TOKEN_CACHE_KEY}:{digest}"
+
+
+def _refresh_lock(key: str) -> threading.Lock:
+    with _state_lock:
+        lock = _refresh_locks.get(key)
+        if lock is None:
+            lock = _refresh_locks[key] = threading.Lock()
+        return lock
+
+
+def _msal_app(tenant_id: str, client_id: str, client_secret: str):
+    key = (tenant_id, client_id)
+    with _state_lock:
+        app = _msal_apps.get(key)
+        if app is None:
+            app = msal.ConfidentialClientApplication(
+                client_id=client_id,
+                client_credential=client_secret,
+                authority=f"https://login.microsoftonline.com/{tenant_id}",
+            )
+            _msal_apps[key] = app
+        return app
+
+
+def _valid_for(tok, seconds: float) -> bool:
+    return bool(tok) and tok.get("expires_at", 0) > time.time() + seconds
+
+
+def _fetch_token(scope, client_id, client_secret, tenant_id) -> dict:
+    app = _msal_app(tenant_id, client_id, client_secret)
+    result = app.acquire_token_for_client(scopes=[scope])
+    metrics.incr("msal_token_fetch")
     if "access_token" not in result:
         # Do not log secrets; include safe error metadata
         err = result.get("error")
@@ -41,16 +76,87 @@ def get_app_token():
         raise DynamicsAuthError(
             f"MSAL error: {err}: {desc}"
         )
-    token = result["access_token"]
-    cache.set(
-        TOKEN_CACHE_KEY,
-        {
-            "access_token": token,
-            "expires_at": time.time() + result["expires_in"] - 30,
-        },
-        result["expires_in"],
-    )
-    return token
+    return {
+        "access_token": result["access_token"],
+        "expires_at": time.time() + int(result.get("expires_in") or 3600),
+    }
+
+
+def acquire_token(
+    scope: str,
+    client_id: str = None,
+    client_secret: str = None,
+    tenant_id: str = None,
+) -> dict:
+    """Return ``{"access_token", "expires_at"}`` for ``scope``.
+
+    Shared by the Dynamics Web API and the Fabric SQL endpoint. Tokens are
+    refreshed MSAL_TOKEN_REFRESH_MARGIN_SECONDS before they expire; only
+    one thread per process and one process per cache refreshes at a time,
+    while the others keep using the still-valid token or wait for the new
+    one. Raises DynamicsAuthError when credentials are missing or AAD
+    refuses the request.
+    """
+    client_id = client_id or settings.DYNAMICS_CLIENT_ID
+    client_secret = client_secret or settings.DYNAMICS_CLIENT_SECRET
+    tenant_id = tenant_id or settings.DYNAMICS_TENANT_ID
+    if not (tenant_id and client_id and client_secret):
+        logger.error("MSAL credentials not fully configured (tenant/client/secret)")
+        raise DynamicsAuthError("Dynamics credentials are not configured")
+    margin = int(getattr(settings, "MSAL_TOKEN_REFRESH_MARGIN_SECONDS", 300))
+    key = _token_cache_key(client_id, scope)
+
+    tok = _local_tokens.get(key)
+    if _valid_for(tok, margin):
+        return tok
+    with _refresh_lock(key):
+        tok = _local_tokens.get(key)
+        if _valid_for(tok, margin):
+            return tok
+        cache = _token_cache()
+        shared = cache.get(key)
+        if _valid_for(shared, margin):
+            _local_tokens[key] = shared
+            return shared
+        current = max(
+            [t for t in (tok, shared) if _valid_for(t, 0)],
+            key=lambda t: t["expires_at"],
+            default=None,
+        )
+        lock_key = f"{key}:refresh"
+        owns_lock = cache.add(lock_key, os.getpid(), timeout=30)
+        if not owns_lock:
+            # Another process is refreshing; keep serving the old token while
+            # it is still valid, otherwise wait briefly for the new one.
+            if current:
+                return current
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline:
+                time.sleep(0.2)
+                shared = cache.get(key)
+                if _valid_for(shared, 0):
+                    _local_tokens[key] = shared
+                    return shared
+        try:
+            tok = _fetch_token(scope, client_id, client_secret, tenant_id)
+        finally:
+            if owns_lock:
+                cache.delete(lock_key)
+        ttl = max(1, int(tok["expires_at"] - time.time()))
+        cache.set(key, tok, ttl)
+        _local_tokens[key] = tok
+        return tok
+
+
+def get_app_token():
+    if not settings.DYNAMICS_TENANT_ID or not settings.DYNAMICS_CLIENT_ID or not settings.DYNAMICS_CLIENT_SECRET:
+        # Configuration missing; surface a clear error for callers
+        logger.error("Dynamics credentials not fully configured (tenant/client/secret)")
+        raise DynamicsAuthError("Dynamics credentials are not configured")
+    if not settings.DYNAMICS_SCOPE:
+        logger.error("Dynamics scope is empty; ensure DYN_ORG_URL is set")
+        raise DynamicsAuthError("Dynamics scope is empty; set DYN_ORG_URL")
+    return acquire_token(settings.DYNAMICS_SCOPE)["access_token"]
 
 
 def _headers(include_annotations: bool = False):
@@ -69,19 +175,82 @@ def _headers(include_annotations: bool = False):
     return h
 
 
+def _is_dynamics_failure(exc) -> bool:
+    # Only outages and throttling trip the breaker, not 4xx like a 404
+    if isinstance(exc, requests.HTTPError):
+        status = getattr(exc.response, "status_code", 0) or 0
+        return status >= 500 or status == 429
+    return isinstance(exc, requests.RequestException)
+
+
+dynamics_circuit = CircuitBreaker("dynamics", is_failure=_is_dynamics_failure)
+
+
+# One keep-alive session per process, shared by all threads. urllib3's pool
+# is thread-safe; after a fork (RQ work horse) a new session is built so
+# sockets are never shared with the parent.
+_http_session = None
+_http_session_pid = None
+_http_session_lock = threading.Lock()
+
+
+def _build_http_session() -> requests.Session:
+    size = int(getattr(settings, "DYNAMICS_HTTP_POOL_SIZE", 10))
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=size,
+        max_retries=0,
+        # Extra concurrent callers open short-lived connections, never wait
+        pool_block=False,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_http_session() -> requests.Session:
+    global _http_session, _http_session_pid
+    pid = os.getpid()
+    if _http_session is None or _http_session_pid != pid:
+        with _http_session_lock:
+            if _http_session is None or _http_session_pid != pid:
+                _http_session = _build_http_session()
+                _http_session_pid = pid
+    return _http_session
+
+
+def _send(method: str, url: str, **kwargs):
+    """Issue a Dataverse request through the breaker and request budget."""
+    default = float(getattr(settings, "DYNAMICS_HTTP_TIMEOUT_SECONDS", 20))
+    connect = float(getattr(settings, "DYNAMICS_HTTP_CONNECT_TIMEOUT_SECONDS", 5))
+    with dynamics_circuit.guard():
+        timeout, clamped = call_timeout(default)
+        try:
+            r = get_http_session().request(
+                method, url, timeout=(min(connect, timeout), timeout), **kwargs
+            )
+        except requests.Timeout as e:
+            if clamped:
+                # Ran out of request budget, not evidence of an outage
+                raise BudgetExceeded(f"Dynamics {method} {url} hit request budget") from e
+            raise
+        r.raise_for_status()
+        return r
+
+
 def dyn_get(path, params=None, include_annotations: bool = False):
     url = (
         f"{settings.DYNAMICS_ORG_URL}/api/data/v9.2/"
         f"{path.lstrip('/')}"
     )
     try:
-        r = requests.get(
+        r = _send(
+            "GET",
             url,
             headers=_headers(include_annotations),
             params=params,
-            timeout=20,
         )
-        r.raise_for_status()
         return r.json()
     except requests.HTTPError as e:
         body = e.response.text if getattr(e, "response", None) else ""
@@ -101,8 +270,7 @@ def dyn_post(path, payload: dict, include_annotations: bool = False):
         "Content-Type": "application/json",
     }
     try:
-        r = requests.post(url, headers=headers, json=payload, timeout=20)
-        r.raise_for_status()
+        r = _send("POST", url, headers=headers, json=payload)
         return r.json() if r.content else None
     except requests.HTTPError as e:
         body = e.response.text if getattr(e, "response", None) else ""
@@ -122,8 +290,7 @@ def dyn_patch(path, payload: dict, include_annotations: bool = False):
         "Content-Type": "application/json",
     }
     try:
-        r = requests.patch(url, headers=headers, json=payload, timeout=20)
-        r.raise_for_status()
+        r = _send("PATCH", url, headers=headers, json=payload)
         return r.json() if r.content else None
     except requests.HTTPError as e:
         body = e.response.text if getattr(e, "response", None) else ""
@@ -139,8 +306,7 @@ def dyn_delete(path):
         f"{path.lstrip('/')}"
     )
     try:
-        r = requests.delete(url, headers=_headers(False), timeout=20)
-        r.raise_for_status()
+        _send("DELETE", url, headers=_headers(False))
         return None
     except requests.HTTPError as e:
         body = e.response.text if getattr(e, "response", None) else ""
@@ -0,0 +1,173 @@
+"""Circuit breakers and per-request time budgets for external calls.
+
+Breaker state lives in the Django cache, so with Redis (CACHE_REDIS_URL)
+every gunicorn worker and RQ job sees the same state. After
+CIRCUIT_FAILURE_THRESHOLD failures within CIRCUIT_FAILURE_WINDOW_SECONDS a
+breaker opens and calls fail fast with ``CircuitOpenError``. Once
+CIRCUIT_OPEN_SECONDS have passed, a single caller is let through as a
+half-open probe: success closes the breaker, failure re-opens it.
+
+``RequestBudgetMiddleware`` gives each request REQUEST_TIME_BUDGET_SECONDS
+for all of its external calls together. Calls clamp their timeouts to what
+is left and raise ``BudgetExceeded`` once it is spent, so views fall through
+to their partial-data paths instead of waiting on every fallback in turn.
+"""
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceUnavailable(Exception):
+    """Base for calls refused without contacting the backend."""
+
+
+class CircuitOpenError(ServiceUnavailable):
+    pass
+
+
+class BudgetExceeded(ServiceUnavailable):
+    pass
+
+
+def _default_is_failure(exc) -> bool:
+    # Refusals that never reached the backend are not failures by default
+    return not isinstance(exc, ServiceUnavailable)
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, is_failure=None):
+        self.name = name
+        self.is_failure = is_failure or _default_is_failure
+        self._open_key = f"circuit:{name}:open_until"
+        self._fail_key = f"circuit:{name}:failures"
+        self._probe_key = f"circuit:{name}:probe"
+
+    @staticmethod
+    def _setting(name, default):
+        return float(getattr(settings, name, default))
+
+    def state(self) -> str:
+        open_until = cache.get(self._open_key)
+        if open_until is None:
+            return "closed"
+        return "open" if time.time() < open_until else "half-open"
+
+    def _before(self):
+        """Return ``(probing, had_failures)`` or raise CircuitOpenError."""
+        try:
+            found = cache.get_many([self._open_key, self._fail_key])
+        except Exception:
+            # Breaker state unavailable: behave as closed
+            return False, False
+        open_until = found.get(self._open_key)
+        if open_until is None:
+            return False, bool(found.get(self._fail_key))
+        if time.time() < open_until:
+            raise CircuitOpenError(f"{self.name} circuit open")
+        probe_ttl = self._setting("CIRCUIT_OPEN_SECONDS", 30)
+        if not cache.add(self._probe_key, 1, timeout=int(probe_ttl)):
+            raise CircuitOpenError(f"{self.name} circuit half-open, probe in flight")
+        return True, True
+
+    def _success(self, probing: bool, had_failures: bool):
+        if probing or had_failures:
+            cache.delete_many([self._open_key, self._fail_key, self._probe_key])
+            if probing:
+                logger.info("Circuit %s closed after successful probe", self.name)
+
+    def _failure(self, probing: bool):
+        window = int(self._setting("CIRCUIT_FAILURE_WINDOW_SECONDS", 60))
+        threshold = int(self._setting("CIRCUIT_FAILURE_THRESHOLD", 5))
+        try:
+            cache.add(self._fail_key, 0, timeout=window)
+            failures = cache.incr(self._fail_key)
+        except Exception:
+            failures = threshold if probing else 0
+        if probing or failures >= threshold:
+            self.trip()
+
+    def trip(self):
+        open_for = self._setting("CIRCUIT_OPEN_SECONDS", 30)
+        # Keep the marker well past open_until so half-open is detectable
+        cache.set(self._open_key, time.time() + open_for, timeout=int(open_for) + 3600)
+        cache.delete_many([self._fail_key, self._probe_key])
+        metrics.incr(f"circuit_open_{self.name}")
+        logger.warning("Circuit %s opened for %ss", self.name, open_for)
+
+    @contextmanager
+    def guard(self):
+        probing, had_failures = self._before()
+        try:
+            yield
+        except Exception as exc:
+            if self.is_failure(exc):
+                self._failure(probing)
+            elif isinstance(exc, ServiceUnavailable):
+                if probing:
+                    cache.delete(self._probe_key)
+            else:
+                self._success(probing, had_failures)
+            raise
+        else:
+            self._success(probing, had_failures)
+
+
+_deadline = contextvars.ContextVar("external_call_deadline", default=None)
+
+
+@contextmanager
+def time_budget(seconds):
+    """Limit external calls inside the block to ``seconds`` in total."""
+    if not seconds or seconds <= 0:
+        yield
+        return
+    deadline = time.monotonic() + float(seconds)
+    outer = _deadline.get()
+    if outer is not None:
+        deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left in the current budget, or ``None`` when unbudgeted."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def call_timeout(default: float) -> tuple[float, bool]:
+    """``(timeout, clamped)`` for a call that would normally use ``default``.
+
+    Raises BudgetExceeded when too little of the budget is left to be worth
+    starting the call.
+    """
+    left = remaining()
+    if left is None:
+        return float(default), False
+    if left < float(getattr(settings, "REQUEST_TIME_BUDGET_MIN_CALL_SECONDS", 0.5)):
+        metrics.incr("budget_exhausted")
+        raise BudgetExceeded("request time budget exhausted")
+    if left < default:
+        return left, True
+    return float(default), False
+
+
+class RequestBudgetMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        seconds = float(getattr(settings, "REQUEST_TIME_BUDGET_SECONDS", 0) or 0)
+        with time_budget(seconds):
+            return self.get_response(request)
@@ -1,29 +1,125 @@
-from django.utils import timezone
 from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
 from accounts.models import User
-from students.models import Student, ParentStudentLink
-from .msal_client import dyn_get
+from accounts.lease import record_validation
+from students.models import ParentStudentLink
+from students import link_cache
+from students.reconcile import reconcile_parent_links
+from .msal_client import dyn_get, get_app_token
+from . import metrics
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 import logging
+import os
+import threading
+import time
 from decimal import Decimal
 
 logger = logging.getLogger(__name__)
 
 
 def validate_parent(user: User) -> bool:
+    """Revalidate a parent's student links, at most once at a time per user.
+
+    The first caller takes a cache lock (shared across workers when the
+    cache is Redis) and runs the validation; concurrent callers for the same
+    user wait for it and reuse its result instead of hitting Fabric/Dynamics
+    again. If no source can be queried, or the wait times out, the existing
+    links are used, but only within VALIDATE_PARENT_OUTAGE_GRACE_SECONDS of
+    the last successful validation.
+    """
+    lock_key = f"validate_parent:lock:{user.pk}"
+    result_key = f"validate_parent:result:{user.pk}"
+    lock_ttl = int(getattr(settings, "VALIDATE_PARENT_LOCK_SECONDS", 60))
+    started = time.time()
+    if cache.add(lock_key, started, timeout=lock_ttl):
+        metrics.incr("validate_parent_run")
+        try:
+            matched = _validate_parent(user)
+            if matched is None:
+                # Couldn't ask Fabric/Dynamics: not a "no students" answer,
+                # so no negative lease; existing links are kept for a while
+                logger.warning(
+                    "validate_parent: sources unavailable for user %s", user.pk,
+                )
+                ok = _degraded_decision(user)
+            else:
+                record_validation(user, matched)
+                ok = matched
+            # Links may have been deactivated via update(), which skips
+            # signals; bump the version and re-prime the shared set
+            link_cache.refresh(user.pk)
+            cache.set(result_key, {"ok": ok, "at": time.time()}, lock_ttl)
+            return ok
+        finally:
+            cache.delete(lock_key)
+
+    metrics.incr("validate_parent_duplicate")
+    wait = float(getattr(settings, "VALIDATE_PARENT_WAIT_SECONDS", 25))
+    deadline = time.monotonic() + wait
+    delay = 0.05
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+        if cache.get(lock_key) is not None:
+            continue
+        res = cache.get(result_key)
+        if res and res.get("at", 0) >= started:
+            user.refresh_from_db(fields=[
+                "last_validated_at", "external_parent_id",
+                "last_unmatched_at", "unmatched_attempts",
+            ])
+            return bool(res.get("ok"))
+        break
+    logger.warning("validate_parent: no shared result for user %s", user.pk)
+    user.refresh_from_db(fields=["last_validated_at"])
+    return _degraded_decision(user)
+
+
+def _degraded_decision(user: User) -> bool:
+    """Existing links, trusted only within the outage grace period."""
+    grace = int(getattr(settings, "VALIDATE_PARENT_OUTAGE_GRACE_SECONDS", 86400))
+    last = user.last_validated_at
+    if last is None or (timezone.now() - last).total_seconds() > grace:
+        metrics.incr("validate_parent_degraded_deny")
+        logger.warning(
+            "validate_parent: user %s last validated %s, outside the %ss grace; denying",
+            user.pk, last, grace,
+        )
+        return False
+    metrics.incr("validate_parent_degraded_allow")
+    return ParentStudentLink.objects.filter(user=user, active=True).exists()
+
+
+def _not_found(exc) -> bool:
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None) == 404
+
+
+def _validate_parent(user: User):
+    """True/False when the sources answered, ``None`` if none could be asked.
+
+    A failed query (outage, open circuit, spent request budget) must not
+    look like "no students matched".
+    """
+    unavailable = False
     try:
         if "fabric" in settings.DATABASES:
             from students.fabric import validate_parent_via_fabric
-            if validate_parent_via_fabric(user):
+            if validate_parent_via_fabric(user, raise_errors=True):
                 return True
     except Exception as e:
         logger.warning("Fabric validation error: %s", str(e))
+        unavailable = True
     if not settings.DYNAMICS_ORG_URL:
-        return False
+        return None if unavailable else False
     contact = None
     if user.external_parent_id:
         try:
             contact = dyn_get(f"contacts({user.external_parent_id})")
-        except Exception:
+        except Exception as e:
+            unavailable = unavailable or not _not_found(e)
             contact = None
     if not contact:
         try:
@@ -37,8 +133,9 @@ def validate_parent(user: User) -> bool:
             values = res.get("value", [])
             contact = values[0] if values else None
         except Exception:
+            unavailable = True
             contact = None
-    active_students = []
+    rows = []
     if contact:
         # No link table: find students by sponsor email field using the parent's login email
         sponsor_field = getattr(
@@ -62,95 +159,49 @@ def validate_parent(user: User) -> bool:
                         "$top": 100,
                     },
                 )
-                for row in res.get("value", []):
-                    external_student_id = row.get("contactid")
-                    if not external_student_id:
-                        continue
-                    st, _ = Student.objects.get_or_create(
-                        external_student_id=external_student_id,
-                        defaults={"first_name": "", "last_name": ""},
-                    )
-                    first = row.get("firstname") or ""
-                    last = row.get("lastname") or ""
-                    if (
-                        (first and st.first_name != first)
-                        or (last and st.last_name != last)
-                    ):
-                        st.first_name = first
-                        st.last_name = last
-                        st.save(update_fields=["first_name", "last_name"])
-                    ParentStudentLink.objects.update_or_create(
-                        user=user,
-                        student=st,
-                        defaults={
-                            "active": True,
-                            "last_verified_at": timezone.now(),
-                        },
-                    )
-                    active_students.append(st.id)
+                rows = [r for r in res.get("value", []) if r.get("contactid")]
             except Exception:
-                pass
-    if not active_students:
-        contacts = get_contacts_by_sponsor1_email(user.email)
-        for c in contacts:
-            sid = c.get("contactid")
-            if not sid:
-                continue
-            st, _ = Student.objects.get_or_create(
-                external_student_id=sid,
-                defaults={"first_name": "", "last_name": ""},
-            )
-            first = c.get("firstname") or ""
-            last = c.get("lastname") or ""
-            if (
-                (first and st.first_name != first)
-                or (last and st.last_name != last)
-            ):
-                st.first_name = first
-                st.last_name = last
-                st.save(update_fields=["first_name", "last_name"])
-            ParentStudentLink.objects.update_or_create(
-                user=user,
-                student=st,
-                defaults={"active": True, "last_verified_at": timezone.now()},
-            )
-            active_students.append(st.id)
-    if active_students:
-        ParentStudentLink.objects.filter(user=user).exclude(
-            student_id__in=active_students
-        ).update(active=False)
-        update_fields = ["last_validated_at"]
-        if (
-            contact
-            and contact.get("contactid")
-            and user.external_parent_id != contact["contactid"]
-        ):
-            user.external_parent_id = contact["contactid"]
-            update_fields.append("external_parent_id")
-        user.last_validated_at = timezone.now()
-        user.save(update_fields=update_fields)
+                unavailable = True
+                rows = []
+    if not rows:
+        try:
+            rows = [
+                c for c in get_contacts_by_sponsor1_email(user.email, raise_errors=True)
+                if c.get("contactid")
+            ]
+        except Exception:
+            unavailable = True
+            rows = []
+    if not rows and unavailable:
+        return None
+    active_students = reconcile_parent_links(
+        user,
+        rows,
+        external_parent_id=(contact or {}).get("contactid"),
+    )
     return bool(active_students)
 
 
-def get_contacts_by_sponsor1_email(email):
+def get_contacts_by_sponsor1_email(email, raise_errors: bool = False):
     if not email:
         return []
     
-    # Check local Contact table first
+    sponsor_field = getattr(
+        settings, "DYNAMICS_SPONSOR1_EMAIL_FIELD", "btfh_sponsor1email"
+    )
+    # Check the local Contact mirror's email index first
     try:
-        from crm.models import Contact
-        qs = Contact.objects.filter(sponsor1_email__iexact=email.strip())
-        if qs.exists():
-            return [c.raw_data for c in qs]
+        from crm.email_index import contacts_by_email, normalize_email
+        found = contacts_by_email([email], sources=[sponsor_field])
+        contacts = found.get(normalize_email(email))
+        if contacts:
+            return [c.raw_data for c in contacts]
     except Exception:
         pass
 
     if not settings.DYNAMICS_ORG_URL:
         return []
         
-    sponsor_field = getattr(
-        settings, "DYNAMICS_SPONSOR1_EMAIL_FIELD", "btfh_sponsor1email"
-    )
     # Case-insensitive compare using tolower() in OData
     safe_email = (email or "").strip().lower().replace("'", "''")
     try:
@@ -169,6 +220,8 @@ def get_contacts_by_sponsor1_email(email):
         )
         return res.get("value", [])
     except Exception:
+        if raise_errors:
+            raise
         return []
 
 
@@ -302,4 +355,72 @@ def fetchxml(logical_name: str, fetch_xml: str, include_annotations: bool = True
         return dyn_get(esn, params={"fetchXml": fetch_xml}, include_annotations=include_annotations)
     except Exception as e:
         logger.warning("FetchXML call failed for %s: %s", logical_name, str(e))
-        return {"value": []}
+        # Flag the empty result so callers can avoid caching it
+        return {"value": [], "unavailable": True}
+
+
+# Bounded pool for fanning out independent Dataverse reads within a request.
+_fetch_executor = None
+_fetch_executor_pid = None
+_fetch_executor_lock = threading.Lock()
+
+
+def _get_fetch_executor() -> ThreadPoolExecutor:
+    global _fetch_executor, _fetch_executor_pid
+    pid = os.getpid()
+    if _fetch_executor is None or _fetch_executor_pid != pid:
+        with _fetch_executor_lock:
+            if _fetch_executor is None or _fetch_executor_pid != pid:
+                _fetch_executor = ThreadPoolExecutor(
+                    max_workers=int(getattr(settings, "DYNAMICS_FETCH_CONCURRENCY", 4)),
+                    thread_name_prefix="dyn-fetch",
+                )
+                _fetch_executor_pid = pid
+    return _fetch_executor
+
+
+def _timed_fetchxml(logical_name, fetch_xml, include_annotations):
+    started = time.monotonic()
+    res = fetchxml(logical_name, fetch_xml, include_annotations=include_annotations)
+    logger.info(
+        "FetchXML %s: %d rows in %.0fms%s",
+        logical_name,
+        len(res.get("value") or []),
+        (time.monotonic() - started) * 1000,
+        " (unavailable)" if res.get("unavailable") else "",
+    )
+    return res
+
+
+def fetchxml_many(queries, include_annotations: bool = True) -> list[dict]:
+    """Run independent ``(logical_name, fetch_xml)`` queries concurrently.
+
+    Results come back in input order with the same shape as ``fetchxml``.
+    The token and entity set names are resolved once up front so the
+    workers share them, and each call runs in a copy of the caller's
+    context so the request time budget still applies.
+    """
+    queries = list(queries)
+    if len(queries) < 2 or not settings.DYNAMICS_ORG_URL:
+        return [_timed_fetchxml(n, x, include_annotations) for n, x in queries]
+    for name in {n for n, _ in queries}:
+        get_entity_set_name(name)
+    try:
+        get_app_token()
+    except Exception:
+        pass
+    started = time.monotonic()
+    pool = _get_fetch_executor()
+    futures = [
+        pool.submit(
+            contextvars.copy_context().run,
+            _timed_fetchxml, name, xml, include_annotations,
+        )
+        for name, xml in queries
+    ]
+    results = [f.result() for f in futures]
+    logger.info(
+        "FetchXML batch: %d queries in %.0fms",
+        len(queries), (time.monotonic() - started) * 1000,
+    )
+    return results
@@ -185,6 +185,9 @@ main() {
   log "Django migrations"
   $MANAGE migrate --noinput
 
+  log "Warm Fabric schema cache"
+  $MANAGE warm_fabric_schema --invalidate || warn "Fabric schema warm-up failed; lookups will discover columns lazily."
+
   log "Collect static"
   mkdir -p "$STATIC_ROOT"
   if ! $MANAGE collectstatic --noinput; then
@@ -2,21 +2,21 @@ from django.contrib.auth.decorators import login_required
 from django.shortcuts import render
 
 from decimal import Decimal
-from students.models import Student
-from students.permissions import parent_can_view_student
+from students.context import get_parent_ctx
 from crm.service import get_contact_balance
 
 
 @login_required
 def index(request):
-    sid = request.session.get("active_student_id")
+    pctx = get_parent_ctx(request)
+    sid = pctx.active_student_id
     ctx = {"active_nav": "financials", "active_student_id": sid}
     student = None
     balance = None
     balance_status = None
     if sid:
-        student = Student.objects.filter(id=sid).first()
-        if student and parent_can_view_student(request.user, student.id):
+        student = pctx.active_student
+        if student and pctx.can_view(student.id):
             ext_id = student.external_student_id
             bal = get_contact_balance(ext_id)
             if bal:
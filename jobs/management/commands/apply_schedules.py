@@ -1,17 +1,60 @@
 from django.core.management.base import BaseCommand
+from django.conf import settings
 from django_rq import get_scheduler
 from mailer.models import Campaign
-from jobs.tasks import kickoff_campaign
+from jobs.tasks import (
+    kickoff_campaign,
+    refresh_parent_links,
+    sync_contacts,
+    sync_programs,
+    sync_transcripts,
+)
 
 class Command(BaseCommand):
-    help = "Apply rq-scheduler cron schedules for enabled campaigns"
+    help = (
+        "Apply rq-scheduler cron schedules for enabled campaigns, contact "
+        "sync, transcript and program sync and the nightly parent link refresh"
+    )
 
     def handle(self, *args, **options):
         scheduler = get_scheduler("default")
         # Clear existing jobs for kickoff to avoid duplicates
         for job in scheduler.get_jobs():
-            if job.func_name.endswith("kickoff_campaign"):
+            if job.func_name.endswith(
+                (
+                    "kickoff_campaign",
+                    "sync_contacts",
+                    "refresh_parent_links",
+                    "sync_transcripts",
+                    "sync_programs",
+                )
+            ):
                 scheduler.cancel(job)
         for c in Campaign.objects.filter(enabled=True):
             scheduler.cron(c.schedule_cron, func=kickoff_campaign, args=[c.id], repeat=None, queue_name="default")
             self.stdout.write(self.style.SUCCESS(f"Scheduled campaign {c.id} with cron '{c.schedule_cron}'"))
+        cron = getattr(settings, "CONTACT_SYNC_CRON", "")
+        if cron and "fabric" in settings.DATABASES:
+            scheduler.cron(
+                cron, func=sync_contacts, repeat=None, queue_name="default",
+                timeout=getattr(settings, "CONTACT_SYNC_JOB_TIMEOUT_SECONDS", 3600),
+            )
+            self.stdout.write(self.style.SUCCESS(f"Scheduled contact sync with cron '{cron}'"))
+        cron = getattr(settings, "PARENT_LINK_REFRESH_CRON", "")
+        if cron and "fabric" in settings.DATABASES:
+            scheduler.cron(cron, func=refresh_parent_links, repeat=None, queue_name="default")
+            self.stdout.write(self.style.SUCCESS(f"Scheduled parent link refresh with cron '{cron}'"))
+        cron = getattr(settings, "TRANSCRIPT_SYNC_CRON", "")
+        if cron and getattr(settings, "DYNAMICS_ORG_URL", ""):
+            scheduler.cron(
+                cron, func=sync_transcripts, repeat=None, queue_name="default",
+                timeout=getattr(settings, "TRANSCRIPT_SYNC_JOB_TIMEOUT_SECONDS", 3600),
+            )
+            self.stdout.write(self.style.SUCCESS(f"Scheduled transcript sync with cron '{cron}'"))
+        cron = getattr(settings, "PROGRAM_SYNC_CRON", "")
+        if cron and getattr(settings, "DYNAMICS_ORG_URL", ""):
+            scheduler.cron(
+                cron, func=sync_programs, repeat=None, queue_name="default",
+                timeout=getattr(settings, "PROGRAM_SYNC_JOB_TIMEOUT_SECONDS", 1800),
+            )
+            self.stdout.write(self.style.SUCCESS(f"Scheduled program sync with cron '{cron}'"))
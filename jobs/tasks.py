@@ -1,4 +1,5 @@
-from django_rq import job
+from contextlib import contextmanager
+from django_rq import get_connection, job
 from django.utils import timezone
 from accounts.models import User
 from mailer.models import Campaign
@@ -6,10 +7,33 @@ from mailer.sending import send_email_to_parent
 from .digest import build_weekly_digest
 from django.conf import settings
 import logging
+import uuid
 
 logger = logging.getLogger(__name__)
 
 
+@contextmanager
+def _run_lock(name: str, ttl: int):
+    """Yield True if this run holds ``name``'s lock, False if another does.
+
+    The lock lives in RQ's Redis, which every worker shares whatever the
+    Django cache backend, and expires with the job timeout so a killed run
+    does not block the next one.
+    """
+    conn = get_connection("default")
+    key = f"job_lock:{name}"
+    token = uuid.uuid4().hex
+    if not conn.set(key, token, nx=True, ex=int(ttl)):
+        logger.info("%s already running; skipping this run", name)
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        if (conn.get(key) or b"").decode() == token:
+            conn.delete(key)
+
+
 @job("default")
 def kickoff_campaign(campaign_id: int):
     campaign = Campaign.objects.get(pk=campaign_id)
@@ -46,3 +70,61 @@ def send_parent_update(campaign_id: int, user_id: int):
             extra={"campaign_id": campaign_id, "user_id": user_id},
         )
         raise
+
+
+@job("default", timeout=getattr(settings, "CONTACT_SYNC_JOB_TIMEOUT_SECONDS", 3600))
+def sync_contacts():
+    # Incremental by default; the command decides when a full reconcile is due
+    from django.core.management import call_command
+
+    ttl = getattr(settings, "CONTACT_SYNC_JOB_TIMEOUT_SECONDS", 3600)
+    with _run_lock("sync_contacts", ttl) as acquired:
+        if acquired:
+            call_command("sync_contacts")
+
+
+@job("default", timeout=getattr(settings, "TRANSCRIPT_SYNC_JOB_TIMEOUT_SECONDS", 3600))
+def sync_transcripts():
+    # Transcript rows, incremental on modifiedon; a full pass runs when due
+    from django.core.management import call_command
+
+    ttl = getattr(settings, "TRANSCRIPT_SYNC_JOB_TIMEOUT_SECONDS", 3600)
+    with _run_lock("sync_transcripts", ttl) as acquired:
+        if acquired:
+            call_command("sync_transcripts")
+
+
+@job("default", timeout=getattr(settings, "PROGRAM_SYNC_JOB_TIMEOUT_SECONDS", 1800))
+def sync_programs():
+    # Student programs, on their own timeout so a slow transcript pass
+    # can't starve them
+    from django.core.management import call_command
+
+    ttl = getattr(settings, "PROGRAM_SYNC_JOB_TIMEOUT_SECONDS", 1800)
+    with _run_lock("sync_programs", ttl) as acquired:
+        if acquired:
+            call_command("sync_programs")
+
+
+@job("default")
+def refresh_parent_links():
+    # Bulk lease renewal for all parents from the local Contact mirror
+    from django.core.management import call_command
+
+    call_command("refresh_parent_links")
+
+
+@job("default")
+def revalidate_parent_links(user_id: int):
+    from crm.service import validate_parent
+
+    user = User.objects.filter(pk=user_id, is_active=True).first()
+    if not user:
+        return
+    try:
+        validate_parent(user)
+    except Exception:
+        logger.exception(
+            "revalidate_parent_links failed", extra={"user_id": user_id}
+        )
+        raise
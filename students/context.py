@@ -0,0 +1,128 @@
+"""Per-request parent context, shared by middleware, decorators and views.
+
+``request.parent_ctx`` resolves the identity lease, the user's active linked
+student ids and the session's active Student lazily and at most once per
+request, so repeated permission checks in one request cost no extra queries.
+"""
+import logging
+from django.conf import settings
+from .link_cache import get_linked_student_ids
+from .models import Student
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = "active_student_id"
+
+
+def external_validation_configured() -> bool:
+    crm_configured = bool(getattr(settings, "DYNAMICS_ORG_URL", None))
+    fabric_configured = "fabric" in getattr(settings, "DATABASES", {})
+    return crm_configured or fabric_configured
+
+
+def _as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ParentContext:
+    _UNSET = object()
+
+    def __init__(self, request):
+        self.request = request
+        self.user = getattr(request, "user", None)
+        self._lease_ok = None
+        self._linked_ids = None
+        self._active_student = self._UNSET
+
+    @property
+    def is_authenticated(self) -> bool:
+        return bool(getattr(self.user, "is_authenticated", False))
+
+    @property
+    def lease_ok(self) -> bool:
+        """Identity lease result for this request (validated at most once)."""
+        if self._lease_ok is None:
+            from accounts.lease import ensure_identity_lease
+
+            try:
+                self._lease_ok = bool(ensure_identity_lease(self.user))
+            except Exception as e:
+                logger.error(
+                    f"Identity lease check raised for user {self.user.pk}: {e}"
+                )
+                self._lease_ok = False
+            # Validation may have changed the links
+            self._linked_ids = None
+        return self._lease_ok
+
+    @property
+    def linked_student_ids(self) -> frozenset:
+        if not self.is_authenticated:
+            return frozenset()
+        if external_validation_configured() and not self.lease_ok:
+            return frozenset()
+        if self._linked_ids is None:
+            self._linked_ids = get_linked_student_ids(self.user.pk)
+        return self._linked_ids
+
+    def can_view(self, student_id) -> bool:
+        if not self.is_authenticated:
+            return False
+        if external_validation_configured() and not self.lease_ok:
+            logger.warning(
+                f"Permission denied: validate_parent failed for user {self.user.pk}"
+            )
+            return False
+        has_link = _as_id(student_id) in self.linked_student_ids
+        if not has_link:
+            logger.warning(
+                f"Permission denied: User {self.user.pk} has no active link to student {student_id}"
+            )
+        return has_link
+
+    @property
+    def active_student_id(self):
+        return _as_id(self.request.session.get(SESSION_KEY))
+
+    @property
+    def active_student(self):
+        """The session's active Student, or None (not permission-checked)."""
+        if self._active_student is self._UNSET:
+            sid = self.active_student_id
+            self._active_student = (
+                Student.objects.filter(id=sid).first() if sid else None
+            )
+        return self._active_student
+
+    def set_active_student(self, student):
+        if student is None:
+            self.request.session.pop(SESSION_KEY, None)
+        else:
+            self.request.session[SESSION_KEY] = student.id
+        self._active_student = student
+
+    def reset(self):
+        """Forget resolved links, e.g. after an explicit revalidation."""
+        self._lease_ok = None
+        self._linked_ids = None
+        self._active_student = self._UNSET
+
+
+def get_parent_ctx(request) -> ParentContext:
+    ctx = getattr(request, "parent_ctx", None)
+    if ctx is None:
+        ctx = ParentContext(request)
+        request.parent_ctx = ctx
+    return ctx
+
+
+class ParentContextMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.parent_ctx = ParentContext(request)
+        return self.get_response(request)
@@ -1,6 +1,6 @@
 from functools import wraps
 from django.http import HttpResponseForbidden
-from .permissions import parent_can_view_student
+from .context import get_parent_ctx
 
 
 def require_parent_access_to_student(param: str = "student_id"):
@@ -12,7 +12,7 @@ def require_parent_access_to_student(param: str = "student_id"):
         @wraps(view_func)
         def _wrapped(request, *args, **kwargs):
             sid = kwargs.get(param) or request.GET.get(param) or request.POST.get(param)
-            if not sid or not parent_can_view_student(request.user, sid):
+            if not sid or not get_parent_ctx(request).can_view(sid):
                 return HttpResponseForbidden("Not authorized")
             return view_func(request, *args, **kwargs)
         return _wrapped
@@ -1,14 +1,37 @@
-from django.db import connections
-from django.utils import timezone
+from django.db import InterfaceError, OperationalError, connections
 from django.conf import settings
-from django.db.models import Q
+from django.core.cache import cache
 from allauth.account.models import EmailAddress
+from contextlib import contextmanager
+import base64
+import json
 import logging
-import msal
+import math
+import os
+import sys
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+from crm.msal_client import DynamicsAuthError, FABRIC_SCOPE, acquire_token
+from crm.resilience import (
+    BudgetExceeded,
+    CircuitBreaker,
+    ServiceUnavailable,
+    call_timeout,
+)
 
 logger = logging.getLogger(__name__)
 
 
+class FabricUnavailable(Exception):
+    pass
+
+
+class FabricPoolExhausted(ServiceUnavailable):
+    """No pooled connection freed up in time; a local capacity limit, so it
+    does not count against the Fabric circuit."""
+
+
 def _pyodbc_module():
     try:
         import pyodbc as _mod
@@ -18,6 +41,24 @@ def _pyodbc_module():
         return None
 
 
+def _is_fabric_failure(exc) -> bool:
+    # Only connectivity, login and timeout errors trip the breaker; a bad
+    # statement (ProgrammingError, DataError, ...) is the caller's problem
+    if isinstance(exc, BudgetExceeded):
+        # A statement cut off by the budget, not one refused before starting
+        return exc.__cause__ is not None
+    if isinstance(exc, ServiceUnavailable):
+        return False
+    if isinstance(exc, (FabricUnavailable, TimeoutError, OperationalError, InterfaceError)):
+        return True
+    # A pyodbc error implies pyodbc is imported; don't import it here
+    odb = sys.modules.get("pyodbc")
+    return odb is not None and isinstance(exc, (odb.OperationalError, odb.InterfaceError))
+
+
+fabric_circuit = CircuitBreaker("fabric", is_failure=_is_fabric_failure)
+
+
 def _conn():
     return connections["fabric"]
 
@@ -61,46 +102,130 @@ essential_fields = (
 )
 
 
-def fetch_contacts_by_sponsor_email(email: str, limit: int = 100):
-    if not email:
-        return []
-    e = (email or "").strip().lower()
-    
-    try:
-        from crm.models import Contact
-        qs = Contact.objects.filter(
-            Q(sponsor1_email__iexact=e) | Q(sponsor2_email__iexact=e) |
-            Q(email__iexact=e)  # Also check direct email just in case
-        )
-        if qs.exists():
-            return [c.raw_data for c in qs[:limit]]
-    except Exception:
-        pass
+def _normalize_email(email) -> str:
+    return (email or "").strip().lower()
+
+
+def _local_contacts_by_sponsor_emails(emails: list[str], limit: int) -> dict:
+    from crm.email_index import sponsor_contacts_by_email
+
+    return {
+        e: [c.raw_data for c in contacts[:limit]]
+        for e, contacts in sponsor_contacts_by_email(emails).items()
+    }
+
 
-    # Try direct pyodbc first to avoid Django DB connection attribute issues
+def _sponsor_lookup_sql(emails: list[str], limit: int):
+    """Build one UNION ALL over every candidate table and sponsor column.
+
+    Each branch projects the same columns (NULL where a table lacks one)
+    plus ``_matched_email`` so the caller can tell which address hit.
+    """
+    tables = []
+    sponsor_cols = []
     for sch, tbl in _candidate_tables():
         cols = _available_sponsor_columns(sch, tbl)
         if not cols:
             continue
-        where = " OR ".join([f"LOWER(LTRIM(RTRIM({c}))) = ?" for c in cols])
-        sql = (
-            f"SELECT TOP {int(limit)} * FROM [{sch}].[{tbl}] WHERE (" f"{where})"
+        lower_map = {c.lower(): c for c in get_table_columns(sch, tbl)}
+        if "contactid" not in lower_map:
+            continue
+        tables.append((sch, tbl, lower_map, cols))
+        for c in cols:
+            if c.lower() not in sponsor_cols:
+                sponsor_cols.append(c.lower())
+    if not tables:
+        return None, []
+    projected = [f.strip() for f in essential_fields.split(",")]
+    projected += [c for c in sponsor_cols if c not in projected]
+    placeholders = ",".join(["?"] * len(emails))
+    branches = []
+    params = []
+    for sch, tbl, lower_map, cols in tables:
+        select_list = ", ".join(
+            f"[{lower_map[f]}] AS [{f}]" if f in lower_map else f"NULL AS [{f}]"
+            for f in projected
         )
-        params = [e] * len(cols)
-        result = _pyodbc_query(sql, params)
-        if result:
-            logger.info(
-                "Fabric sponsor query (pyodbc): table=%s.%s email=%s matches=%d cols=%s",
-                sch,
-                tbl,
-                e,
-                len(result),
-                ",".join(cols),
+        for col in cols:
+            norm = f"LOWER(LTRIM(RTRIM([{col}])))"
+            branches.append(
+                f"SELECT {norm} AS _matched_email, {select_list} "
+                f"FROM [{sch}].[{tbl}] WHERE {norm} IN ({placeholders})"
             )
-            return result
+            params.extend(emails)
+    sql = (
+        f"SELECT TOP {int(limit) * len(emails)} * FROM ("
+        + " UNION ALL ".join(branches)
+        + ") AS sponsor_matches"
+    )
+    return sql, params
+
+
+def fetch_contacts_by_sponsor_emails(
+    emails, limit: int = 100, raise_errors: bool = False
+) -> dict:
+    """Look up students for several sponsor emails in one round trip.
+
+    Returns ``{normalized_email: [row, ...]}`` containing only the emails
+    that matched. The local Contact mirror is consulted first; emails it
+    cannot answer are resolved with a single UNION ALL query across every
+    table in FABRIC_CONTACT_TABLES and every sponsor-email column. With
+    ``raise_errors`` a failed Fabric lookup raises instead of reading as
+    "no match".
+    """
+    wanted = sorted({_normalize_email(e) for e in emails if _normalize_email(e)})
+    if not wanted:
+        return {}
+    matches = {}
+    try:
+        matches = _local_contacts_by_sponsor_emails(wanted, limit)
+    except Exception:
+        matches = {}
+    remaining = [e for e in wanted if e not in matches]
+    if not remaining:
+        return matches
+
+    sql, params = _sponsor_lookup_sql(remaining, limit)
+    if not sql:
+        if raise_errors:
+            # Column discovery failed too, or no table has sponsor columns
+            raise FabricUnavailable("no Fabric table with sponsor email columns")
+        return matches
+    # SQL Server caps a statement at 2100 parameters; split only if needed
+    per_email = len(params) // len(remaining)
+    chunk = max(1, 2000 // per_email)
+    seen = set()
+    for i in range(0, len(remaining), chunk):
+        part = remaining[i:i + chunk]
+        if len(part) != len(remaining):
+            sql, params = _sponsor_lookup_sql(part, limit)
+        for row in _pyodbc_query(sql, params, raise_errors=raise_errors):
+            e = row.pop("_matched_email", None)
+            key = (e, row.get("contactid"))
+            if e not in part or key in seen:
+                continue
+            seen.add(key)
+            rows = matches.setdefault(e, [])
+            if len(rows) < limit:
+                rows.append(row)
+    logger.info(
+        "Fabric sponsor query (batched): emails=%d matched=%s",
+        len(remaining),
+        {e: len(matches.get(e, [])) for e in remaining},
+    )
+    return matches
+
+
+def fetch_contacts_by_sponsor_email(email: str, limit: int = 100):
+    if not email:
+        return []
+    e = _normalize_email(email)
+    result = fetch_contacts_by_sponsor_emails([e], limit=limit).get(e)
+    if result:
+        return result
     # Fallback to Django DB connection if configured
     try:
-        with _conn().cursor() as cr:
+        with fabric_circuit.guard(), _conn().cursor() as cr:
             cr.execute(
                 (
                     f"SELECT TOP {int(limit)} {essential_fields} "
@@ -131,7 +256,7 @@ def fetch_contacts_by_sponsor_email(email: str, limit: int = 100):
     return []
 
 
-def validate_parent_via_fabric(user) -> bool:
+def validate_parent_via_fabric(user, raise_errors: bool = False) -> bool:
     emails = set()
     if getattr(user, "email", None):
         emails.add(user.email.strip().lower())
@@ -148,53 +273,27 @@ def validate_parent_via_fabric(user) -> bool:
         "Fabric validate: user_id=%s building email set",
         getattr(user, "id", "?"),
     )
+    by_email = fetch_contacts_by_sponsor_emails(emails, raise_errors=raise_errors)
     found = []
-    for e in emails:
-        found.extend(fetch_contacts_by_sponsor_email(e))
+    seen = set()
+    for e in sorted(by_email):
+        for row in by_email[e]:
+            sid = row.get("contactid")
+            if sid and sid not in seen:
+                seen.add(sid)
+                found.append(row)
     logger.info(
-        "Fabric validate: user_id=%s emails=%d matches=%d",
+        "Fabric validate: user_id=%s emails=%d matches=%d matched_emails=%s",
         getattr(user, "id", "?"),
         len(emails),
         len(found),
+        ",".join(sorted(by_email)) or "<none>",
     )
     if not found:
         return False
-    from students.models import Student, ParentStudentLink
+    from students.reconcile import reconcile_parent_links
 
-    active_ids = []
-    for row in found:
-        sid = row.get("contactid")
-        if not sid:
-            continue
-        st, _ = Student.objects.get_or_create(
-            external_student_id=sid,
-            defaults={"first_name": "", "last_name": ""},
-        )
-        fn = row.get("firstname") or ""
-        ln = row.get("lastname") or ""
-        upd = []
-        if fn and st.first_name != fn:
-            st.first_name = fn
-            upd.append("first_name")
-        if ln and st.last_name != ln:
-            st.last_name = ln
-            upd.append("last_name")
-        if upd:
-            st.save(update_fields=upd)
-        ParentStudentLink.objects.update_or_create(
-            user=user,
-            student=st,
-            defaults={"active": True, "last_verified_at": timezone.now()},
-        )
-        active_ids.append(st.id)
-    if active_ids:
-        ParentStudentLink.objects.filter(user=user).exclude(
-            student_id__in=active_ids
-        ).update(active=False)
-        user.last_validated_at = timezone.now()
-        user.save(update_fields=["last_validated_at"])
-        return True
-    return False
+    return bool(reconcile_parent_links(user, found, source="fabric"))
 
 
 def _prepare_token(tok: str) -> bytes:
@@ -208,15 +307,23 @@ def _prepare_token(tok: str) -> bytes:
     return struct.pack("=i", len(exptoken)) + exptoken
 
 
-def _pyodbc_conn():
+def _pyodbc_connect():
+    """Open a new Fabric ODBC connection.
+
+    Returns ``(connection, expires_at)`` where ``expires_at`` is the epoch
+    time the access token behind the connection lapses (``None`` when the
+    service-principal fallback was used). ``(None, None)`` on failure.
+    Connections run in autocommit so a pooled connection never pins an old
+    snapshot inside a long-lived read transaction.
+    """
     dbs = getattr(settings, "DATABASES", {})
     cfg = dbs.get("fabric")
     if not cfg:
         logger.warning("Fabric DB config missing in settings.DATABASES")
-        return None
+        return None, None
     odb = _pyodbc_module()
     if not odb:
-        return None
+        return None, None
     opts = cfg.get("OPTIONS", {})
     driver = opts.get("driver", "ODBC Driver 18 for SQL Server")
     host = cfg.get("HOST", "")
@@ -233,18 +340,20 @@ def _pyodbc_conn():
     tenant = getattr(settings, "DYNAMICS_TENANT_ID", "")
     if not (tenant and user and pwd and server and name):
         logger.warning("Fabric token connect missing config pieces")
-        return None
-    authority = f"https://login.microsoftonline.com/{tenant}"
-    app = msal.ConfidentialClientApplication(
-        client_id=user, client_credential=pwd, authority=authority
-    )
-    result = app.acquire_token_for_client(
-        scopes=["https://database.windows.net/.default"]
-    )
-    access_token = result.get("access_token")
-    if not access_token:
-        logger.warning("Fabric token acquisition failed: %s", str(result))
-        return None
+        return None, None
+    try:
+        tok = acquire_token(
+            FABRIC_SCOPE, client_id=user, client_secret=pwd, tenant_id=tenant
+        )
+    except DynamicsAuthError as ex:
+        logger.warning("Fabric token acquisition failed: %s", str(ex))
+        return None, None
+    # pyodbc takes whole seconds
+    connect_timeout = max(1, math.ceil(call_timeout(
+        float(getattr(settings, "FABRIC_CONNECT_TIMEOUT_SECONDS", 30))
+    )[0]))
+    access_token = tok["access_token"]
+    expires_at = tok["expires_at"]
     token_bytes = _prepare_token(access_token)
     conn_str = ";".join(
         [
@@ -259,9 +368,10 @@ def _pyodbc_conn():
         cn = odb.connect(
             conn_str,
             attrs_before={1256: token_bytes},
-            timeout=30,
+            timeout=connect_timeout,
+            autocommit=True,
         )
-        return cn
+        return cn, expires_at
     except Exception as ex:
         logger.warning("Fabric pyodbc token connect failed: %s", str(ex))
         # Fallback: use service principal auth via connection string
@@ -278,31 +388,313 @@ def _pyodbc_conn():
                     f"PWD={pwd}",
                 ]
             )
-            cn2 = odb.connect(conn_str_sp, timeout=30)
-            return cn2
+            cn2 = odb.connect(conn_str_sp, timeout=connect_timeout, autocommit=True)
+            return cn2, None
         except Exception as ex2:
             logger.warning("Fabric pyodbc SPN connect failed: %s", str(ex2))
+            return None, None
+
+
+def _pyodbc_conn():
+    """Open a dedicated (unpooled) Fabric connection; caller must close it."""
+    cn, _ = _pyodbc_connect()
+    return cn
+
+
+class _PooledConn:
+    __slots__ = ("conn", "expires_at", "created_at", "last_used")
+
+    def __init__(self, conn, expires_at):
+        now = time.time()
+        self.conn = conn
+        self.expires_at = expires_at
+        self.created_at = now
+        self.last_used = now
+
+
+class FabricConnectionPool:
+    """Thread-safe pool of long-lived Fabric connections.
+
+    Connections are leased for the duration of one query and handed back
+    afterwards. On checkout a connection is replaced when its access token
+    is about to lapse, when it has outlived ``max_lifetime``, or when it has
+    been idle for ``ping_after`` seconds and fails a ``SELECT 1``. A lease
+    that raises is discarded rather than returned. The pool is per-process
+    and starts empty again after a fork, so gunicorn workers and RQ work
+    horses never share a socket.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 4,
+        timeout: float = 10.0,
+        max_lifetime: float = 3000.0,
+        ping_after: float = 60.0,
+        token_margin: float = 120.0,
+        stats_interval: float = 300.0,
+    ):
+        self.max_size = max(1, int(max_size))
+        self.timeout = float(timeout)
+        self.max_lifetime = float(max_lifetime)
+        self.ping_after = float(ping_after)
+        self.token_margin = float(token_margin)
+        self.stats_interval = float(stats_interval)
+        self._init_state()
+
+    def _init_state(self):
+        self._pid = os.getpid()
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = []
+        self._open = 0
+        self._in_use = 0
+        self._last_stats_log = time.monotonic()
+        self._counters = {
+            "created": 0,
+            "reused": 0,
+            "discarded": 0,
+            "connect_failures": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "timeouts": 0,
+            "peak_in_use": 0,
+        }
+
+    def _check_fork(self):
+        if os.getpid() != self._pid:
+            # Inherited sockets belong to the parent; drop them untouched.
+            self._init_state()
+
+    def _is_usable(self, pc: _PooledConn) -> bool:
+        now = time.time()
+        if pc.expires_at and pc.expires_at - self.token_margin <= now:
+            return False
+        if self.max_lifetime and now - pc.created_at >= self.max_lifetime:
+            return False
+        if self.ping_after and now - pc.last_used >= self.ping_after:
+            try:
+                cr = pc.conn.cursor()
+                try:
+                    cr.execute("SELECT 1")
+                    cr.fetchall()
+                finally:
+                    cr.close()
+            except Exception as ex:
+                logger.info("Fabric pool health check failed: %s", str(ex))
+                return False
+        return True
+
+    @staticmethod
+    def _close(pc: _PooledConn):
+        try:
+            pc.conn.close()
+        except Exception:
+            pass
+
+    def _checkout(self, timeout=None):
+        """Reserve a slot: an idle connection, a fresh slot (``True``) or ``None``."""
+        timeout = self.timeout if timeout is None else min(self.timeout, timeout)
+        deadline = time.monotonic() + timeout
+        started = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    slot = self._idle.pop()
+                    break
+                if self._open < self.max_size:
+                    self._open += 1
+                    slot = True
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    logger.warning(
+                        "Fabric pool exhausted: size=%d waited=%.1fs",
+                        self.max_size,
+                        timeout,
+                    )
+                    return None
+                if started is None:
+                    started = time.monotonic()
+                    self._counters["waits"] += 1
+                self._cond.wait(remaining)
+            if started is not None:
+                self._counters["wait_seconds"] += time.monotonic() - started
+            self._in_use += 1
+            if self._in_use > self._counters["peak_in_use"]:
+                self._counters["peak_in_use"] = self._in_use
+        return slot
+
+    def _give_back_slot(self):
+        with self._cond:
+            self._open -= 1
+            self._in_use -= 1
+            self._cond.notify()
+
+    def acquire(self, timeout=None):
+        """Lease a connection; returns a ``_PooledConn`` or ``None``.
+
+        ``timeout`` caps the wait for a free slot below the pool's own;
+        FabricPoolExhausted is raised when none frees up in time. ``None``
+        means a new connection could not be opened.
+        """
+        self._check_fork()
+        slot = self._checkout(timeout)
+        if slot is None:
+            raise FabricPoolExhausted("Fabric connection pool exhausted")
+        if slot is not True:
+            if self._is_usable(slot):
+                with self._cond:
+                    self._counters["reused"] += 1
+                return slot
+            self._close(slot)
+            with self._cond:
+                self._counters["discarded"] += 1
+        try:
+            cn, expires_at = _pyodbc_connect()
+        except BaseException:
+            self._give_back_slot()
+            raise
+        if not cn:
+            with self._cond:
+                self._counters["connect_failures"] += 1
+            self._give_back_slot()
             return None
+        with self._cond:
+            self._counters["created"] += 1
+        return _PooledConn(cn, expires_at)
 
+    def release(self, pc: _PooledConn, discard: bool = False):
+        if os.getpid() != self._pid:
+            self._close(pc)
+            return
+        if discard:
+            self._close(pc)
+            with self._cond:
+                self._counters["discarded"] += 1
+            self._give_back_slot()
+        else:
+            pc.last_used = time.time()
+            with self._cond:
+                self._idle.append(pc)
+                self._in_use -= 1
+                self._cond.notify()
+        self._maybe_log_stats()
 
-def _pyodbc_query(sql: str, params: list):
-    cn = _pyodbc_conn()
-    if not cn:
-        return []
-    try:
+    @contextmanager
+    def lease(self, timeout=None):
+        """Context manager yielding a raw connection (or ``None``)."""
+        pc = self.acquire(timeout)
+        if pc is None:
+            yield None
+            return
+        ok = False
+        try:
+            yield pc.conn
+            ok = True
+        finally:
+            self.release(pc, discard=not ok)
+
+    def stats(self) -> dict:
+        with self._cond:
+            data = dict(self._counters)
+            data.update(
+                {
+                    "pid": self._pid,
+                    "max_size": self.max_size,
+                    "open": self._open,
+                    "idle": len(self._idle),
+                    "in_use": self._in_use,
+                }
+            )
+        data["wait_seconds"] = round(data["wait_seconds"], 3)
+        return data
+
+    def _maybe_log_stats(self):
+        if not self.stats_interval:
+            return
+        now = time.monotonic()
+        with self._cond:
+            if now - self._last_stats_log < self.stats_interval:
+                return
+            self._last_stats_log = now
+        logger.info("Fabric pool stats: %s", self.stats())
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for pc in idle:
+            self._close(pc)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_fabric_pool() -> FabricConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = FabricConnectionPool(
+                    max_size=getattr(settings, "FABRIC_POOL_SIZE", 4),
+                    timeout=getattr(settings, "FABRIC_POOL_TIMEOUT_SECONDS", 10),
+                    max_lifetime=getattr(
+                        settings, "FABRIC_POOL_MAX_LIFETIME_SECONDS", 3000
+                    ),
+                    ping_after=getattr(
+                        settings, "FABRIC_POOL_PING_AFTER_SECONDS", 60
+                    ),
+                    stats_interval=getattr(
+                        settings, "FABRIC_POOL_STATS_LOG_SECONDS", 300
+                    ),
+                )
+    return _pool
+
+
+def fabric_pool_stats() -> dict:
+    """Snapshot of this process's Fabric pool counters (for sizing)."""
+    return get_fabric_pool().stats()
+
+
+def _run_query(sql: str, params: list):
+    default = float(getattr(settings, "FABRIC_QUERY_TIMEOUT_SECONDS", 30))
+    wait, _ = call_timeout(default)
+    with get_fabric_pool().lease(timeout=wait) as cn:
+        if not cn:
+            raise FabricUnavailable("could not open a Fabric connection")
+        query_timeout, clamped = call_timeout(default)
+        # Connection.timeout is the per-statement timeout (whole seconds)
+        cn.timeout = max(1, math.ceil(query_timeout))
         cr = cn.cursor()
-        cr.execute(sql, params or [])
-        rows = cr.fetchall()
-        cols = [c[0] for c in cr.description]
+        try:
+            try:
+                cr.execute(sql, params or [])
+            except Exception as ex:
+                if clamped and "timeout" in str(ex).lower():
+                    raise BudgetExceeded("Fabric query hit request budget") from ex
+                raise
+            rows = cr.fetchall()
+            cols = [c[0] for c in cr.description]
+        finally:
+            cr.close()
         return [{cols[i]: r[i] for i in range(len(cols))} for r in rows]
+
+
+def _pyodbc_query(sql: str, params: list, raise_errors: bool = False):
+    try:
+        with fabric_circuit.guard():
+            return _run_query(sql, params)
+    except ServiceUnavailable as ex:
+        logger.info("Fabric query skipped: %s", str(ex))
+        if raise_errors:
+            raise
+        return []
     except Exception as ex:
         logger.warning("Fabric pyodbc query failed: %s", str(ex))
+        if raise_errors:
+            raise
         return []
-    finally:
-        try:
-            cn.close()
-        except Exception:
-            pass
 
 
 def _pyodbc_columns(schema: str, table: str) -> list[str]:
@@ -314,8 +706,74 @@ def _pyodbc_columns(schema: str, table: str) -> list[str]:
     return [r.get("COLUMN_NAME") for r in rows if r.get("COLUMN_NAME")]
 
 
-def _available_sponsor_columns(schema: str, table: str) -> list[str]:
+SCHEMA_CACHE_PREFIX = "fabric_columns"
+
+
+def _schema_cache_version() -> int:
+    return cache.get_or_set(f"{SCHEMA_CACHE_PREFIX}:version", 1, None)
+
+
+def _schema_cache_key(schema: str, table: str) -> str:
+    return (
+        f"{SCHEMA_CACHE_PREFIX}:v{_schema_cache_version()}:"
+        f"{schema.lower()}.{table.lower()}"
+    )
+
+
+def get_table_columns(schema: str, table: str, refresh: bool = False) -> list[str]:
+    """Column names of a Fabric table, cached per (schema, table).
+
+    Cached for FABRIC_SCHEMA_CACHE_TTL_SECONDS; empty results (table missing
+    or the query failed) are not cached so the next call retries.
+    """
+    key = _schema_cache_key(schema, table)
+    if not refresh:
+        cols = cache.get(key)
+        if cols is not None:
+            return cols
     cols = _pyodbc_columns(schema, table)
+    if cols:
+        ttl = int(getattr(settings, "FABRIC_SCHEMA_CACHE_TTL_SECONDS", 86400))
+        cache.set(key, cols, ttl)
+    return cols
+
+
+def get_table_column_types(schema: str, table: str, refresh: bool = False) -> dict:
+    """``{column_name_lower: DATA_TYPE}`` for a Fabric table, cached like
+    ``get_table_columns``."""
+    key = f"{_schema_cache_key(schema, table)}:types"
+    if not refresh:
+        types = cache.get(key)
+        if types is not None:
+            return types
+    sql = (
+        "SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS "
+        "WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?"
+    )
+    types = {
+        r["COLUMN_NAME"].lower(): (r.get("DATA_TYPE") or "").lower()
+        for r in _pyodbc_query(sql, [schema, table]) if r.get("COLUMN_NAME")
+    }
+    if types:
+        ttl = int(getattr(settings, "FABRIC_SCHEMA_CACHE_TTL_SECONDS", 86400))
+        cache.set(key, types, ttl)
+    return types
+
+
+def invalidate_table_columns(schema: str = None, table: str = None):
+    """Drop cached columns for one table, or for every table when omitted."""
+    if schema and table:
+        key = _schema_cache_key(schema, table)
+        cache.delete_many([key, f"{key}:types"])
+        return
+    try:
+        cache.incr(f"{SCHEMA_CACHE_PREFIX}:version")
+    except ValueError:
+        cache.set(f"{SCHEMA_CACHE_PREFIX}:version", 2, None)
+
+
+def _available_sponsor_columns(schema: str, table: str) -> list[str]:
+    cols = get_table_columns(schema, table)
     if not cols:
         return []
     lower_map = {c.lower(): c for c in cols}
@@ -344,7 +802,7 @@ def _available_sponsor_columns(schema: str, table: str) -> list[str]:
                 uniq.append(c)
                 seen.add(c)
         avail = uniq
-    logger.info(
+    logger.debug(
         "Detected sponsor-email columns on %s.%s: %s",
         schema,
         table,
@@ -377,14 +835,245 @@ def _parse_schema_table(raw: str) -> tuple[str, str]:
     return "dbo", "atrisk"
 
 
+def _atrisk_table() -> str:
+    schema, table = _atrisk_schema_table()
+    return f"[{schema}].[{table}]"
+
+
+def _atrisk_schema_table() -> tuple[str, str]:
+    return _parse_schema_table(getattr(settings, "FABRIC_ATRISK_TABLE", "PP.atrisk"))
+
+
 def fetch_atrisk_for_student(student_external_id: str, limit: int = 500):
     if not student_external_id:
         return []
-    raw = getattr(settings, "FABRIC_ATRISK_TABLE", "PP.atrisk")
-    schema, table = _parse_schema_table(raw)
     sql = (
-        f"SELECT TOP {int(limit)} * FROM [{schema}].[{table}] "
+        f"SELECT TOP {int(limit)} * FROM {_atrisk_table()} "
         "WHERE edv_studentid = ? "
         "ORDER BY edv_year DESC, edv_week DESC, createdon DESC"
     )
     return _pyodbc_query(sql, [student_external_id])
+
+
+# Free-text search (``q``) matches any of these, case-insensitively
+ATRISK_SEARCH_COLUMNS = (
+    "edv_modulecode",
+    "edv_primaryreason",
+    "edv_secondaryreason",
+    "edv_comments",
+)
+# Keyset order of the at-risk listing, newest first; the table's primary id
+# (FABRIC_ATRISK_ID_COLUMN) is appended as a unique tiebreaker
+ATRISK_KEYSET = ("edv_year", "edv_week", "createdon")
+# Assumed column types when INFORMATION_SCHEMA can't be read
+ATRISK_DEFAULT_TYPES = {
+    "edv_year": "int",
+    "edv_week": "int",
+    "edv_block": "nvarchar",
+    "createdon": "datetime2",
+}
+_NUMERIC_TYPES = {
+    "bit", "tinyint", "smallint", "int", "bigint",
+    "decimal", "numeric", "float", "real", "money", "smallmoney",
+}
+_DATETIME_TYPES = {"date", "datetime", "datetime2", "smalldatetime", "datetimeoffset"}
+
+
+def _atrisk_id_column() -> str:
+    return getattr(settings, "FABRIC_ATRISK_ID_COLUMN", "edv_atriskid")
+
+
+def _atrisk_keyset() -> tuple[str, ...]:
+    return (*ATRISK_KEYSET, _atrisk_id_column())
+
+
+def _atrisk_column_type(col: str) -> str:
+    found = get_table_column_types(*_atrisk_schema_table()).get(col.lower())
+    if found:
+        return found
+    if col == _atrisk_id_column():
+        return "uniqueidentifier"
+    return ATRISK_DEFAULT_TYPES.get(col, "nvarchar")
+
+
+def _null_sentinel(data_type: str):
+    """A value below every real one, standing in for NULL in the keyset.
+
+    Numeric keys (year, week) are never negative.
+    """
+    if data_type in _NUMERIC_TYPES:
+        return -1
+    if data_type in _DATETIME_TYPES:
+        return "1900-01-01T00:00:00"
+    if data_type == "uniqueidentifier":
+        return "00000000-0000-0000-0000-000000000000"
+    return ""
+
+
+def _keyset_terms() -> list[tuple[str, str, object]]:
+    """``(column, sql_expression, sentinel)`` for each keyset column."""
+    terms = []
+    for col in _atrisk_keyset():
+        sentinel = _null_sentinel(_atrisk_column_type(col))
+        literal = sentinel if isinstance(sentinel, int) else f"'{sentinel}'"
+        terms.append((col, f"COALESCE({col}, {literal})", sentinel))
+    return terms
+
+
+def _like_escape(value: str) -> str:
+    for ch in ("\\", "%", "_", "["):
+        value = value.replace(ch, "\\" + ch)
+    return value
+
+
+def _typed_param(data_type: str, value):
+    """``value`` (a facet string) as a parameter for a ``data_type`` column,
+    or ``None`` if it can't be one."""
+    if data_type in _NUMERIC_TYPES:
+        try:
+            number = Decimal(str(value).strip())
+        except InvalidOperation:
+            return None
+        if not number.is_finite():
+            return None
+        return int(number) if number == number.to_integral_value() else number
+    return str(value)
+
+
+def _facet_value(value) -> str:
+    """Display/form string for a facet; ``_typed_param`` parses it back."""
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        number = Decimal(str(value))
+        if number.is_finite() and number == number.to_integral_value():
+            return str(int(number))
+        return format(number.normalize(), "f")
+    return str(value)
+
+
+def _atrisk_filters(student_external_id, year=None, block=None, q=None):
+    """``(where_sql, params)`` for one student's at-risk rows."""
+    clauses = ["edv_studentid = ?"]
+    params = [student_external_id]
+    # Compare the column as stored, with the form value converted to its type
+    for col, value in (("edv_year", year), ("edv_block", block)):
+        if not value:
+            continue
+        typed = _typed_param(_atrisk_column_type(col), value)
+        if typed is None:
+            # Not a value this column can hold
+            clauses.append("1 = 0")
+            continue
+        clauses.append(f"{col} = ?")
+        params.append(typed)
+    q = (q or "").strip().lower()
+    if q:
+        # LOWER() because Fabric warehouses default to a case-sensitive collation
+        pattern = f"%{_like_escape(q)}%"
+        clauses.append("(" + " OR ".join(
+            f"LOWER(CAST({c} AS VARCHAR(8000))) LIKE ? ESCAPE '\\'"
+            for c in ATRISK_SEARCH_COLUMNS
+        ) + ")")
+        params.extend([pattern] * len(ATRISK_SEARCH_COLUMNS))
+    return " AND ".join(clauses), params
+
+
+def encode_atrisk_cursor(row: dict, terms=None) -> str:
+    """Opaque page token pointing just past ``row`` in the keyset order."""
+    values = []
+    for col, _, sentinel in terms or _keyset_terms():
+        v = row.get(col)
+        if v is None:
+            v = sentinel
+        values.append(v.isoformat() if hasattr(v, "isoformat") else v)
+    raw = json.dumps(values, default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_atrisk_cursor(token):
+    """Keyset values from ``encode_atrisk_cursor``, or ``None`` if invalid."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(str(token) + "=" * (-len(str(token)) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if (not isinstance(values, list) or len(values) != len(ATRISK_KEYSET) + 1
+            or not all(isinstance(v, (str, int, float)) for v in values)):
+        return None
+    return values
+
+
+def _keyset_after(exprs: list[str], values: list) -> tuple[str, list]:
+    """``(sql, params)`` for rows strictly after ``values`` in DESC order."""
+    head, rest = exprs[0], exprs[1:]
+    if not rest:
+        return f"{head} < ?", [values[0]]
+    inner, inner_params = _keyset_after(rest, values[1:])
+    return (
+        f"({head} < ? OR ({head} = ? AND {inner}))",
+        [values[0], values[0], *inner_params],
+    )
+
+
+def fetch_atrisk_page(
+    student_external_id: str,
+    year=None,
+    block=None,
+    q=None,
+    after=None,
+    page_size: int = 50,
+) -> dict:
+    """One page of a student's at-risk rows, filtered in Fabric.
+
+    Rows are ordered by ``ATRISK_KEYSET`` descending, then by the primary id;
+    ``after`` is the ``next_cursor`` of the previous page. Returns
+    ``{"rows", "next_cursor"}`` with ``next_cursor`` ``None`` on the last
+    page. NULL keys are COALESCEd to a sentinel in both the ORDER BY and the
+    cursor predicate, so they sort last and page like any other value.
+    """
+    if not student_external_id:
+        return {"rows": [], "next_cursor": None}
+    where, params = _atrisk_filters(student_external_id, year, block, q)
+    terms = _keyset_terms()
+    exprs = [expr for _, expr, _ in terms]
+    keys = decode_atrisk_cursor(after)
+    if keys is not None:
+        after_sql, after_params = _keyset_after(exprs, keys)
+        where += f" AND {after_sql}"
+        params += after_params
+    size = max(1, int(page_size))
+    sql = (
+        f"SELECT TOP {size + 1} * FROM {_atrisk_table()} "
+        f"WHERE {where} "
+        f"ORDER BY {' DESC, '.join(exprs)} DESC"
+    )
+    rows = _pyodbc_query(sql, params)
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_atrisk_cursor(rows[-1], terms)
+    return {"rows": rows, "next_cursor": next_cursor}
+
+
+def fetch_atrisk_facets(student_external_id: str) -> dict:
+    """``{"years", "blocks"}`` present in a student's at-risk rows."""
+    if not student_external_id:
+        return {"years": [], "blocks": []}
+    sql = (
+        f"SELECT DISTINCT edv_year, edv_block FROM {_atrisk_table()} "
+        "WHERE edv_studentid = ?"
+    )
+    rows = _pyodbc_query(sql, [student_external_id])
+    years = {_facet_value(r.get("edv_year")) for r in rows if r.get("edv_year")}
+    blocks = {_facet_value(r.get("edv_block")) for r in rows if r.get("edv_block")}
+    return {"years": sorted(years, reverse=True), "blocks": sorted(blocks)}
+
+
+def count_atrisk_for_student(student_external_id: str):
+    """Number of at-risk rows for a student, or ``None`` if Fabric failed."""
+    if not student_external_id:
+        return 0
+    sql = f"SELECT COUNT(*) AS n FROM {_atrisk_table()} WHERE edv_studentid = ?"
+    rows = _pyodbc_query(sql, [student_external_id])
+    return rows[0].get("n") if rows else None
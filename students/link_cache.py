@@ -0,0 +1,99 @@
+"""Shared cache of the student ids each parent may view.
+
+Entries are keyed by a per-user version number; invalidating bumps the
+version, so a set computed before a link was deactivated can never be read
+again, even if a slow reader writes it back afterwards. ParentStudentLink
+save/delete signals and the email receivers in accounts.signals invalidate;
+bulk ``QuerySet.update()`` calls bypass signals and must call
+``invalidate()`` themselves.
+
+The cache is only used when it is shared (CACHE_REDIS_URL). With the
+per-process local-memory cache a link deactivated in another worker or RQ
+job could keep granting access until the TTL ran out, so every call reads
+the database instead.
+"""
+import logging
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def _version_key(user_id) -> str:
+    return f"linked_students:ver:{user_id}"
+
+
+def _fresh_version() -> int:
+    # Time-based, so a version key lost to eviction never comes back with a
+    # number whose old data entry is still cached
+    return int(time.time() * 1000)
+
+
+def _version(user_id) -> int:
+    key = _version_key(user_id)
+    ver = cache.get(key)
+    if ver is None:
+        cache.add(key, _fresh_version(), timeout=None)
+        ver = cache.get(key)
+    return ver
+
+
+def _ttl() -> int:
+    return int(getattr(settings, "LINKED_STUDENTS_CACHE_TTL_SECONDS", 300))
+
+
+def _enabled() -> bool:
+    return bool(getattr(settings, "CACHE_REDIS_URL", ""))
+
+
+def get_linked_student_ids(user_id) -> frozenset:
+    """Return the ids of students actively linked to ``user_id``."""
+    if not user_id:
+        return frozenset()
+    if not _enabled():
+        return _load(user_id)
+    try:
+        data_key = f"linked_students:{user_id}:v{_version(user_id)}"
+        ids = cache.get(data_key)
+    except Exception as e:
+        logger.warning("Linked-student cache unavailable: %s", str(e))
+        return _load(user_id)
+    if ids is None:
+        ids = _load(user_id)
+        try:
+            cache.set(data_key, sorted(ids), _ttl())
+        except Exception:
+            pass
+    return frozenset(ids)
+
+
+def _load(user_id) -> frozenset:
+    from .models import ParentStudentLink
+
+    return frozenset(
+        ParentStudentLink.objects.filter(user_id=user_id, active=True)
+        .values_list("student_id", flat=True)
+    )
+
+
+def invalidate(user_id):
+    if not user_id or not _enabled():
+        return
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # No version stored yet (or evicted): start from a new one
+        cache.set(key, _fresh_version(), timeout=None)
+    except Exception as e:
+        logger.warning(
+            "Could not invalidate linked students for user %s: %s",
+            user_id, str(e),
+        )
+
+
+def refresh(user_id) -> frozenset:
+    """Invalidate and immediately re-prime from the database."""
+    invalidate(user_id)
+    return get_linked_student_ids(user_id)
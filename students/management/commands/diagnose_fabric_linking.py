@@ -3,7 +3,7 @@ from django.conf import settings
 from accounts.models import User
 from allauth.account.models import EmailAddress
 from students.fabric import (
-    fetch_contacts_by_sponsor_email,
+    fetch_contacts_by_sponsor_emails,
     _pyodbc_query,
 )
 
@@ -87,8 +87,9 @@ class Command(BaseCommand):
         )
 
         total = 0
+        by_email = fetch_contacts_by_sponsor_emails(emails, limit=opts["limit"])
         for e in sorted(emails):
-            rows = fetch_contacts_by_sponsor_email(e, limit=opts["limit"])
+            rows = by_email.get(e, [])
             total += len(rows)
             self.stdout.write(
                 f"\nEmail {e}: {len(rows)} match(es)"
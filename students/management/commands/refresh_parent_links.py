@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from students.reconcile import refresh_all_from_mirror
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every parent's student links from the local Contact "
+        "mirror in bulk and renew their identity lease. Run after "
+        "sync_contacts (scheduled nightly via PARENT_LINK_REFRESH_CRON)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Users reconciled per transaction (default: 500)",
+        )
+
+    def handle(self, *args, **opts):
+        stats = refresh_all_from_mirror(batch_size=max(1, opts["batch_size"]))
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed links for {stats['matched']}/{stats['users']} parents: "
+            f"changed={stats['changed']} links={stats['links']} "
+            f"deactivated={stats['deactivated']} renamed={stats['renamed']}."
+        ))
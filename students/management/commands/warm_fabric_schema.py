@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from students.fabric import (
+    _available_sponsor_columns,
+    _candidate_tables,
+    _parse_schema_table,
+    get_table_column_types,
+    get_table_columns,
+    invalidate_table_columns,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-warm the Fabric column cache (INFORMATION_SCHEMA) for the "
+        "configured contact and at-risk tables. Run at deploy time; does "
+        "nothing unless the cache is shared (CACHE_REDIS_URL)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--invalidate",
+            action="store_true",
+            help="Drop all cached column lists before warming",
+        )
+
+    def handle(self, *args, **opts):
+        if "fabric" not in settings.DATABASES:
+            self.stderr.write("Fabric DB not configured (settings.DATABASES).")
+            return
+        if not getattr(settings, "CACHE_REDIS_URL", ""):
+            # A local-memory cache would only be warmed for this process
+            self.stdout.write(self.style.WARNING(
+                "Cache is not shared (CACHE_REDIS_URL unset); skipping warm-up. "
+                "Web and worker processes discover columns lazily."
+            ))
+            return
+        if opts.get("invalidate"):
+            invalidate_table_columns()
+            self.stdout.write("Invalidated cached Fabric column lists.")
+
+        for sch, tbl in _candidate_tables():
+            if self._warm(sch, tbl):
+                sponsor = _available_sponsor_columns(sch, tbl)
+                self.stdout.write(
+                    f"  sponsor columns: {','.join(sponsor) or '<none>'}"
+                )
+        sch, tbl = _parse_schema_table(
+            getattr(settings, "FABRIC_ATRISK_TABLE", "PP.atrisk")
+        )
+        if self._warm(sch, tbl):
+            # Typed at-risk filters and keyset sentinels
+            get_table_column_types(sch, tbl, refresh=True)
+
+    def _warm(self, schema, table) -> bool:
+        cols = get_table_columns(schema, table, refresh=True)
+        if not cols:
+            self.stdout.write(
+                self.style.WARNING(f"{schema}.{table}: no columns found")
+            )
+            return False
+        self.stdout.write(
+            self.style.SUCCESS(f"{schema}.{table}: {len(cols)} columns cached")
+        )
+        return True
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("students", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="student",
+            name="program_id",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="student",
+            name="program_name",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+        migrations.AddField(
+            model_name="student",
+            name="program_period_createdon",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="student",
+            name="program_synced_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
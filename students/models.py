@@ -6,6 +6,12 @@ class Student(models.Model):
     external_student_id = models.CharField(max_length=64, unique=True)
     first_name = models.CharField(max_length=64)
     last_name = models.CharField(max_length=64)
+    # Current program from Dynamics academic period details, kept by
+    # academics.programs; program_synced_at is None until first resolved
+    program_id = models.CharField(max_length=64, blank=True, default="")
+    program_name = models.CharField(max_length=255, blank=True, default="")
+    program_period_createdon = models.DateTimeField(blank=True, null=True)
+    program_synced_at = models.DateTimeField(blank=True, null=True)
 
 class ParentStudentLink(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -1,32 +1,27 @@
 import logging
-from django.conf import settings
-from django.utils import timezone
-from .models import ParentStudentLink
+from .context import _as_id, external_validation_configured
+from .link_cache import get_linked_student_ids
 
 logger = logging.getLogger(__name__)
 
 def parent_can_view_student(user, student_id) -> bool:
+    # Views should prefer request.parent_ctx.can_view(), which memoizes the
+    # lease check and linked ids for the whole request.
     if not getattr(user, "is_authenticated", False):
         return False
         
-    # Check if Dynamics is configured; if not, we loosely trust local DB for dev/legacy reasons
-    crm_configured = bool(getattr(settings, "DYNAMICS_ORG_URL", None))
-    fabric_configured = "fabric" in getattr(settings, "DATABASES", {})
-    
-    ttl = getattr(settings, "IDENTITY_LEASE_TTL_SECONDS", 3600)
-    should_validate = not user.last_validated_at or (timezone.now() - user.last_validated_at).total_seconds() > ttl
-    
-    if should_validate and (crm_configured or fabric_configured):
-        from crm.service import validate_parent
+    # If Dynamics/Fabric are not configured, we loosely trust local DB for dev/legacy reasons
+    if external_validation_configured():
+        from accounts.lease import ensure_identity_lease
         try:
-            if not validate_parent(user):
+            if not ensure_identity_lease(user):
                 logger.warning(f"Permission denied: validate_parent failed for user {user.pk}")
                 return False
         except Exception as e:
             logger.error(f"Permission denied: validate_parent raised exception for user {user.pk}: {e}")
             return False
 
-    has_link = ParentStudentLink.objects.filter(user=user, student_id=student_id, active=True).exists()
+    has_link = _as_id(student_id) in get_linked_student_ids(user.pk)
     if not has_link:
         logger.warning(f"Permission denied: User {user.pk} has no active link to student {student_id}")
         
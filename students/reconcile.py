@@ -0,0 +1,277 @@
+"""Set-based reconciliation of a parent's student links.
+
+Both validation paths (Dynamics in crm.service, Fabric in students.fabric)
+hand the matched student contact rows to ``reconcile_parent_links``, which
+applies them in one transaction with a fixed number of statements instead
+of several per child. ``refresh_all_from_mirror`` does the same for every
+parent at once from the local Contact mirror (nightly job).
+"""
+import logging
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from . import link_cache
+from .models import ParentStudentLink, Student
+
+logger = logging.getLogger(__name__)
+
+
+def _students_by_row(rows) -> dict:
+    """``{contactid: (firstname, lastname)}``, first non-empty name wins."""
+    out = {}
+    for row in rows:
+        sid = row.get("contactid")
+        if not sid:
+            continue
+        first, last = out.get(sid, ("", ""))
+        out[sid] = (
+            first or row.get("firstname") or "",
+            last or row.get("lastname") or "",
+        )
+    return out
+
+
+def _upsert_students(wanted: dict) -> tuple[dict, int]:
+    """Create/rename Students for ``{ext_id: (first, last)}``.
+
+    Returns ``({ext_id: student_pk}, renamed_count)``; call inside a
+    transaction.
+    """
+    exts = list(wanted)
+    existing = {}
+    for i in range(0, len(exts), 500):
+        for st in Student.objects.filter(external_student_id__in=exts[i:i + 500]):
+            existing[st.external_student_id] = st
+    Student.objects.bulk_create(
+        [
+            Student(external_student_id=ext, first_name=first, last_name=last)
+            for ext, (first, last) in wanted.items()
+            if ext not in existing
+        ],
+        ignore_conflicts=True,
+        batch_size=500,
+    )
+    renamed = []
+    for ext, st in existing.items():
+        first, last = wanted[ext]
+        # Only overwrite with non-empty names
+        if (first and st.first_name != first) or (last and st.last_name != last):
+            st.first_name = first or st.first_name
+            st.last_name = last or st.last_name
+            renamed.append(st)
+    if renamed:
+        Student.objects.bulk_update(renamed, ["first_name", "last_name"], batch_size=500)
+
+    ids = {}
+    for i in range(0, len(exts), 500):
+        ids.update(
+            Student.objects.filter(external_student_id__in=exts[i:i + 500])
+            .values_list("external_student_id", "id")
+        )
+    return ids, len(renamed)
+
+
+def reconcile_parent_links(
+    user, rows, source: str = "crm", external_parent_id: str | None = None
+) -> list[int]:
+    """Make ``rows`` the user's active students; return their Student ids.
+
+    Students are created or renamed in bulk, links upserted in bulk, links
+    to any other student deactivated, and the user's ``last_validated_at``
+    (plus ``external_parent_id`` when given) stamped. With no usable rows
+    nothing is changed and ``[]`` is returned.
+    """
+    wanted = _students_by_row(rows)
+    if not wanted:
+        return []
+    now = timezone.now()
+    with transaction.atomic():
+        ids_by_ext, renamed = _upsert_students(wanted)
+        student_ids = list(ids_by_ext.values())
+        ParentStudentLink.objects.bulk_create(
+            [
+                ParentStudentLink(
+                    user=user, student_id=sid, active=True,
+                    source=source, last_verified_at=now,
+                )
+                for sid in student_ids
+            ],
+            update_conflicts=True,
+            unique_fields=["user", "student"],
+            update_fields=["active", "last_verified_at"],
+        )
+        deactivated = (
+            ParentStudentLink.objects.filter(user=user, active=True)
+            .exclude(student_id__in=student_ids)
+            .update(active=False)
+        )
+
+        update_fields = ["last_validated_at"]
+        user.last_validated_at = now
+        if external_parent_id and user.external_parent_id != external_parent_id:
+            user.external_parent_id = external_parent_id
+            update_fields.append("external_parent_id")
+        user.save(update_fields=update_fields)
+
+        # Bulk writes skip ParentStudentLink signals
+        transaction.on_commit(lambda: link_cache.invalidate(user.pk))
+
+    logger.info(
+        "Reconciled links for user %s: active=%d renamed=%d deactivated=%d",
+        user.pk, len(student_ids), renamed, deactivated,
+    )
+    return student_ids
+
+
+def _parent_emails(user_ids) -> dict:
+    """``{user_id: {normalized email, ...}}`` from User and allauth addresses."""
+    from accounts.models import User
+    from allauth.account.models import EmailAddress
+    from crm.email_index import normalize_email
+
+    out = {pk: set() for pk in user_ids}
+    for pk, email in User.objects.filter(pk__in=user_ids).values_list("pk", "email"):
+        if email:
+            out[pk].add(normalize_email(email))
+    q = EmailAddress.objects.filter(user_id__in=user_ids)
+    if not getattr(settings, "FABRIC_INCLUDE_UNVERIFIED_ALT_EMAILS", False):
+        q = q.filter(verified=True)
+    for pk, email in q.values_list("user_id", "email"):
+        if email:
+            out[pk].add(normalize_email(email))
+    return out
+
+
+def _mirror_students_by_email(emails) -> dict:
+    """``{email: {contact_id: (first, last)}}`` from the local Contact mirror.
+
+    Same rule as login validation (email_index.sponsor_contacts_by_email),
+    done as one values() query per chunk.
+    """
+    from crm.email_index import sponsor_email_fields
+    from crm.models import ContactEmail
+
+    out = {}
+    emails = sorted(emails)
+    sources = sponsor_email_fields()
+    for i in range(0, len(emails), 500):
+        q = ContactEmail.objects.filter(
+            email__in=emails[i:i + 500], source__in=sources
+        ).values_list(
+            "email", "contact__contact_id",
+            "contact__first_name", "contact__last_name",
+        )
+        for email, ext, first, last in q:
+            out.setdefault(email, {})[ext] = (first or "", last or "")
+    return out
+
+
+def _refresh_batch(user_ids, now, stats):
+    emails_by_user = _parent_emails(user_ids)
+    by_email = _mirror_students_by_email(
+        set().union(*emails_by_user.values()) if emails_by_user else set()
+    )
+    wanted_by_user = {}
+    for pk, emails in emails_by_user.items():
+        wanted = {}
+        for e in sorted(emails):
+            for ext, (first, last) in by_email.get(e, {}).items():
+                f0, l0 = wanted.get(ext, ("", ""))
+                wanted[ext] = (f0 or first, l0 or last)
+        if wanted:
+            wanted_by_user[pk] = wanted
+    # Unmatched parents keep their links and lease, as in validate_parent
+    if not wanted_by_user:
+        return
+    all_wanted = {}
+    for wanted in wanted_by_user.values():
+        for ext, names in wanted.items():
+            f0, l0 = all_wanted.get(ext, ("", ""))
+            all_wanted[ext] = (f0 or names[0], l0 or names[1])
+
+    with transaction.atomic():
+        ids_by_ext, renamed = _upsert_students(all_wanted)
+        current = {}
+        for pk, uid, sid, active in ParentStudentLink.objects.filter(
+            user_id__in=list(wanted_by_user)
+        ).values_list("pk", "user_id", "student_id", "active"):
+            current.setdefault(uid, {})[sid] = (pk, active)
+
+        upserts = []
+        deactivate = []
+        changed = set()
+        for uid, wanted in wanted_by_user.items():
+            mine = current.get(uid, {})
+            desired = {ids_by_ext[ext] for ext in wanted if ext in ids_by_ext}
+            for sid in desired:
+                if not mine.get(sid, (None, False))[1]:
+                    changed.add(uid)
+                upserts.append(ParentStudentLink(
+                    user_id=uid, student_id=sid, active=True,
+                    source="mirror", last_verified_at=now,
+                ))
+            for sid, (pk, active) in mine.items():
+                if active and sid not in desired:
+                    deactivate.append(pk)
+                    changed.add(uid)
+
+        ParentStudentLink.objects.bulk_create(
+            upserts,
+            update_conflicts=True,
+            unique_fields=["user", "student"],
+            update_fields=["active", "last_verified_at"],
+            batch_size=500,
+        )
+        for i in range(0, len(deactivate), 500):
+            ParentStudentLink.objects.filter(
+                pk__in=deactivate[i:i + 500]
+            ).update(active=False)
+
+        from accounts.models import User
+
+        User.objects.filter(pk__in=list(wanted_by_user)).update(
+            last_validated_at=now, last_unmatched_at=None, unmatched_attempts=0
+        )
+        # Bulk writes skip ParentStudentLink signals
+        transaction.on_commit(
+            lambda: [link_cache.invalidate(uid) for uid in changed]
+        )
+
+    stats["matched"] += len(wanted_by_user)
+    stats["changed"] += len(changed)
+    stats["links"] += len(upserts)
+    stats["deactivated"] += len(deactivate)
+    stats["renamed"] += renamed
+
+
+def refresh_all_from_mirror(batch_size: int = 500) -> dict:
+    """Recompute every parent's links from the local Contact mirror.
+
+    Parents' emails (login plus allauth addresses) are joined against the
+    ContactEmail sponsor index; differences are applied in bulk per batch
+    of users and matched users get ``last_validated_at`` stamped, so their
+    next logins are inside the lease without any Fabric/Dynamics call.
+    Parents with no match are left to the per-user validation path.
+    """
+    from accounts.models import User
+    from crm.models import Contact
+
+    stats = {
+        "users": 0, "matched": 0, "changed": 0,
+        "links": 0, "deactivated": 0, "renamed": 0,
+    }
+    if not Contact.objects.exists():
+        # An empty mirror (never synced) must not look like "no students"
+        logger.warning("Contact mirror is empty; skipping bulk link refresh")
+        return stats
+    user_ids = list(
+        User.objects.filter(is_parent=True, is_active=True)
+        .order_by("pk").values_list("pk", flat=True)
+    )
+    now = timezone.now()
+    for i in range(0, len(user_ids), batch_size):
+        batch = user_ids[i:i + batch_size]
+        stats["users"] += len(batch)
+        _refresh_batch(batch, now, stats)
+    logger.info("Bulk link refresh: %s", stats)
+    return stats
@@ -0,0 +1,14 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import link_cache
+from .models import ParentStudentLink
+
+
+@receiver(post_save, sender=ParentStudentLink)
+@receiver(post_delete, sender=ParentStudentLink)
+def invalidate_linked_students(sender, instance, **kwargs):
+    user_id = instance.user_id
+    link_cache.invalidate(user_id)
+    # Again after commit, so a set re-read mid-transaction is not kept
+    transaction.on_commit(lambda: link_cache.invalidate(user_id))
@@ -3,10 +3,10 @@ from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.contrib import messages
-from .models import ParentStudentLink, Student
+from .models import ParentStudentLink
 from crm.service import get_contact_by_id, validate_parent
 from django.conf import settings
-from .permissions import parent_can_view_student
+from .context import get_parent_ctx
 from .fabric import fetch_contact_by_id as fabric_contact_by_id
 
 
@@ -32,11 +32,13 @@ def switch_student(request):
         messages.error(request, "No student ID provided.")
         return redirect("students:list")
     
-    if not parent_can_view_student(request.user, sid):
+    pctx = get_parent_ctx(request)
+    if not pctx.can_view(sid):
         messages.error(request, "Unable to switch to that student. Please ensure they are linked to your profile.")
         return redirect("students:list")
         
     request.session["active_student_id"] = int(sid)
+    pctx.reset()
     
     # Auto-redirect back to where they came from if 'next' is set
     nxt = request.GET.get("next")
@@ -49,12 +51,13 @@ def switch_student(request):
 
 @login_required
 def profile(request):
-    sid = request.session.get("active_student_id")
+    pctx = get_parent_ctx(request)
+    sid = pctx.active_student_id
     if not sid:
         return redirect("students:list")
-    if not parent_can_view_student(request.user, sid):
+    if not pctx.can_view(sid):
         return HttpResponseBadRequest("invalid student")
-    st = Student.objects.filter(id=sid).first()
+    st = pctx.active_student
     if not st:
         return redirect("students:list")
     contact = None
@@ -77,7 +80,8 @@ def profile(request):
 
 @login_required
 def refresh_links(request):
-    # Force revalidation of parent↔student links using Fabric/Dynamics
+    # Force revalidation of parent↔student links using Fabric/Dynamics;
+    # bypasses the identity lease, including a negative (no matches) one
     from crm.service import validate_parent
 
     try:
@@ -96,12 +100,11 @@ def auto_select_student(request):
         validate_parent(request.user)
     except Exception:
         pass
-    sid = request.session.get("active_student_id")
-    student = None
-    if sid:
-        student = Student.objects.filter(id=sid).first()
-        if not student:
-            request.session.pop("active_student_id", None)
+    pctx = get_parent_ctx(request)
+    pctx.reset()
+    student = pctx.active_student
+    if pctx.active_student_id and not student:
+        pctx.set_active_student(None)
     if not student:
         link = (
             ParentStudentLink.objects.select_related("student")
@@ -116,7 +119,7 @@ def auto_select_student(request):
         )
         if link and link.student:
             student = link.student
-            request.session["active_student_id"] = student.id
+            pctx.set_active_student(student)
     if not student:
         return JsonResponse({"ok": False})
     name = f"{student.first_name} {student.last_name}".strip()
@@ -11,14 +11,18 @@ def index(request):
         if not subject or not body:
             return HttpResponseBadRequest("subject and body required")
         from .models import Ticket
-        from students.permissions import parent_can_view_student
+        from students.context import get_parent_ctx
         sid = request.POST.get("student_id")
         student = None
         if sid:
-            if not parent_can_view_student(request.user, sid):
+            pctx = get_parent_ctx(request)
+            if not pctx.can_view(sid):
                 return HttpResponseBadRequest("invalid student")
-            from students.models import Student
-            student = Student.objects.filter(id=sid).first()
+            if pctx.active_student_id == int(sid):
+                student = pctx.active_student
+            else:
+                from students.models import Student
+                student = Student.objects.filter(id=sid).first()
         Ticket.objects.create(user=request.user, student=student, category=category, subject=subject, body=body)
         return render(request, "support/index.html", {"submitted": True, "active_nav": "support"})
     return render(request, "support/index.html", {"active_nav": "support"})
@@ -45,8 +45,8 @@ def test_financial_block():
             'firstname': student.first_name
         }
         
-        # We also need to mock parent_can_view_student to True
-        with patch('academics.views.parent_can_view_student', return_value=True):
+        # We also need the parent permission check (request.parent_ctx) to pass
+        with patch('students.context.ParentContext.can_view', return_value=True):
             print("  --> Simulating BLOCKED student...")
             response = transcript(request)
             
@@ -69,9 +69,12 @@ def test_financial_block():
         # We might hit errors later in the view because we aren't mocking fetchxml, 
         # but if we get past the block check, we won't see "Access Restricted".
         
-        with patch('academics.views.parent_can_view_student', return_value=True):
-            # We also need to mock fetchxml to avoid network errors or xml parsing errors
-            with patch('academics.views.fetchxml', return_value={"value": []}): 
+        with patch('students.context.ParentContext.can_view', return_value=True):
+            # We also need to mock the transcript data sources to avoid network errors
+            with patch('academics.views.transcript_store.is_ready', return_value=False), \
+                 patch('academics.views.transcript_cache.get', return_value=None), \
+                 patch('academics.views.programs.program_for', return_value=("", None, False)), \
+                 patch('academics.views._live_course_history', return_value=[{"value": []}] * 3): 
                 print("  --> Simulating UNBLOCKED student...")
                 response = transcript(request)
                 content = response.content.decode()